@@ -1,6 +1,3 @@
-import uuid
-from datetime import datetime
-
 from flasgger import swag_from
 from flask import Blueprint, request
 from flask_jwt_extended import (jwt_required,
@@ -9,10 +6,13 @@ from flask_jwt_extended import (jwt_required,
                                 create_access_token,
                                 create_refresh_token)
 
-from config import FRONTEND_ENDPOINT, UserStatus
-from model import User, RevokedToken
+from config import FRONTEND_ENDPOINT
+from model import User
 from model.db import db
-from services.user import find_user_by_email
+from services.password_reset import create_reset_code, find_user_by_reset_code, consume_reset_codes
+from services.token_blacklist import revoke_token
+from services.token_epoch import revoke_user_tokens
+from services.user import find_user_by_email, find_active_user_by_email
 from tasks.mail import send_mail_reset_password
 from utils.exceptions import BadRequest
 from utils.responser import generate_success_response
@@ -29,16 +29,15 @@ auth = Blueprint('auth', __name__, url_prefix='/auth')
 def login():
     body = request.data
     account = body.copy()
-    user = User.query.filter(
-        User.email == account['email'].lower(),
-        User.status != UserStatus.BLOCKED.value
-    ).first()
+    user = find_active_user_by_email(account['email'])
     if not user:
         raise BadRequest('Login failed. Please enter a valid login name and password.')
     if not user.check_password(account['password']):
         raise BadRequest('Login failed. Please enter a valid login name and password.')
-    access_token = create_access_token(identity=str(user.id))
-    refresh_token = create_refresh_token(identity=str(user.id))
+    if user.rehash_password_if_needed(account['password']):
+        db.session.commit()
+    access_token = create_access_token(identity=user)
+    refresh_token = create_refresh_token(identity=user)
     data = {
         'access_token': access_token,
         'refresh_token': refresh_token,
@@ -51,9 +50,7 @@ def login():
 @jwt_required
 @swag_from('../apidocs/auth/logout_access.yml')
 def logout_access():
-    jti = get_raw_jwt()['jti']
-    revoked_token = RevokedToken(jti=jti)
-    revoked_token.add()
+    revoke_token(get_raw_jwt())
     return generate_success_response()
 
 
@@ -61,9 +58,16 @@ def logout_access():
 @jwt_refresh_token_required
 @swag_from('../apidocs/auth/logout_refresh.yml')
 def logout_refresh():
-    jti = get_raw_jwt()['jti']
-    revoked_token = RevokedToken(jti=jti)
-    revoked_token.add()
+    revoke_token(get_raw_jwt())
+    return generate_success_response()
+
+
+@auth.route('/logout-all', methods=['POST'])
+@jwt_required
+@swag_from('../apidocs/auth/logout_all.yml')
+def logout_all():
+    user = User.query.get_or_404(get_jwt_identity())
+    revoke_user_tokens(user, session=db.session)
     return generate_success_response()
 
 
@@ -100,10 +104,8 @@ def forgot_password():
     user = find_user_by_email(body['email'])
     if not user:
         raise BadRequest('email is not found')
-    user.request_forgot_password_at = datetime.utcnow()
-    user.set_password_code = str(uuid.uuid4())
-    db.session.commit()
-    reset_link = f'{FRONTEND_ENDPOINT}/reset-password?token={user.set_password_code}'
+    code = create_reset_code(user, session=db.session)
+    reset_link = f'{FRONTEND_ENDPOINT}/reset-password?token={code}'
     send_mail_reset_password(user, reset_link)
     return generate_success_response()
 
@@ -113,11 +115,10 @@ def forgot_password():
 @swag_from('../apidocs/auth/reset_password.yml')
 def reset_password():
     body = request.data
-    user = db.session.query(User).filter_by(set_password_code=body['set_password_code']).first()
+    user = find_user_by_reset_code(body['set_password_code'])
     if not bool(user):
-        raise BadRequest('set password code is not found')
-    user.request_forgot_password_at = None
-    user.set_password_code = None
+        raise BadRequest('set password code is not found or has expired')
+    consume_reset_codes(user)
     user.set_password(body['password'])
     db.session.commit()
     return generate_success_response()
@@ -0,0 +1,18 @@
+from flasgger import swag_from
+from flask import Blueprint
+from flask_jwt_extended import jwt_required
+
+from config import UserRole
+from utils import metrics
+from utils.permission import authorized
+from utils.responser import generate_success_response
+
+metrics_route = Blueprint('metrics', __name__, url_prefix='/metrics')
+
+
+@metrics_route.route('', methods=['GET'])
+@jwt_required
+@authorized([UserRole.ADMIN.value])
+@swag_from('../apidocs/metrics/get_metrics.yml')
+def get_metrics():
+    return generate_success_response(metrics.snapshot())
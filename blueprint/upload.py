@@ -1,10 +1,15 @@
 from flasgger import swag_from
-from flask import Blueprint, request, Response
+from flask import Blueprint, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
 
+from config import STREAM_UPLOAD_MAX_SIZE
 from services.storage import storage
+from services.upload_session import create_upload_session, complete_upload_session
 from utils.exceptions import BadRequest, ApplicationError
 from utils.file_upload import allowed_file, get_filename
 from utils.responser import generate_success_response
+from utils.schema_validator import validated
+from validation.upload import CREATE_UPLOAD_SESSION_SCHEMA
 
 upload_route = Blueprint('upload', __name__, url_prefix='/uploads')
 
@@ -12,6 +17,8 @@ upload_route = Blueprint('upload', __name__, url_prefix='/uploads')
 @upload_route.route('', methods=['POST'])
 @swag_from('../apidocs/upload/upload_file.yml')
 def upload_file_to_s3():
+    if request.mimetype != 'multipart/form-data':
+        return upload_stream_to_s3()
     file = request.files['file'] if 'file' in request.files else None
     if file is None:
         raise BadRequest('Form data invalid')
@@ -27,16 +34,56 @@ def upload_file_to_s3():
     return generate_success_response(data={'filename': filename})
 
 
+def upload_stream_to_s3():
+    """
+    Raw body upload, named by the ``filename`` query parameter. Unlike form
+    data, which werkzeug spools to disk first, the body is piped from the
+    socket straight into multipart parts.
+    """
+    original_filename = request.args.get('filename', '')
+    if original_filename == '':
+        raise BadRequest('filename is required')
+    if not allowed_file(original_filename):
+        raise BadRequest('Extension is not allow')
+    # werkzeug only applies MAX_CONTENT_LENGTH to form data, and gives a body without Content-Length as empty
+    if not request.content_length:
+        raise BadRequest('Content-Length is required')
+    if request.content_length > STREAM_UPLOAD_MAX_SIZE:
+        raise BadRequest(f'File is larger than {STREAM_UPLOAD_MAX_SIZE} bytes')
+    filename = get_filename(original_filename)
+    try:
+        storage.upload_file_obj(request.stream, filename, request.mimetype or 'application/octet-stream')
+    except Exception as e:
+        raise ApplicationError(e)
+    return generate_success_response(data={'filename': filename})
+
+
+@upload_route.route('/sessions', methods=['POST'])
+@jwt_required
+@validated(CREATE_UPLOAD_SESSION_SCHEMA)
+@swag_from('../apidocs/upload/create_session.yml')
+def create_session():
+    """Lets the client upload straight to the bucket, the file bytes never go through the API."""
+    body = request.data
+    if not allowed_file(body['filename']):
+        raise BadRequest('Extension is not allow')
+    data = create_upload_session(get_jwt_identity(), body['filename'], body['content_type'], body['size'],
+                                 method=body['method'])
+    return generate_success_response(data)
+
+
+@upload_route.route('/sessions/<uuid:session_id>/complete', methods=['POST'])
+@jwt_required
+@swag_from('../apidocs/upload/complete_session.yml')
+def complete_session(session_id):
+    upload_session = complete_upload_session(session_id, get_jwt_identity())
+    return generate_success_response(data={'filename': upload_session.key, 'size': upload_session.size})
+
+
 @upload_route.route('/<filename>', methods=['GET'])
 @swag_from('../apidocs/upload/get_file.yml')
 def get_file_from_s3(filename):
-    if not storage.check_if_object_exists(filename):
-        raise BadRequest('File not found')
-    try:
-        file = storage.get_object(filename).get()
-    except Exception as e:
-        raise ApplicationError(str(e))
-    return Response(file['Body'].read(), mimetype=file['ContentType'])
+    return storage.send_object(filename)
 
 
 @upload_route.route('/<filename>', methods=['PUT'])
@@ -47,8 +94,7 @@ def update(filename):
     if file is None:
         raise BadRequest('Form data invalid')
     try:
-        s3_object = storage.get_object(filename)
-        s3_object.upload_fileobj(Fileobj=file, ExtraArgs={'ContentType': file.mimetype})
+        storage.upload_file_obj(file, filename, file.mimetype)
     except Exception as e:
         raise ApplicationError(str(e))
-    return Response(file['Body'].read(), mimetype=file['ContentType'])
+    return generate_success_response(data={'filename': filename})
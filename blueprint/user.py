@@ -1,23 +1,32 @@
 from flasgger import swag_from
-from flask import Blueprint, request
+from flask import Blueprint, Response, request, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import desc
 
-from config import UserRole, UserStatus
+from config import UserRole, UserStatus, EXPORT_BATCH_SIZE, BULK_CREATE_SYNC_MAX_ITEMS
 from model import User
-from model.db import db
-from services.user import get_user_profile_or_404, create_user
+from model.db import db, COUNT_MODES
+from services.collection_version import get_shared_collection_version
+from services.token_epoch import revoke_user_tokens
+from services.user import get_user_profile_or_404, create_user, forget_user_role_and_status, \
+    get_user_fields_or_404, bulk_create_users, bulk_update_users, get_user_updated_at_or_404
+from tasks.user import bulk_create_users_task
 
 from utils.exceptions import BadRequest
+from utils.exporter import EXPORT_FORMATS, generate_csv, generate_ndjson
 from utils.permission import authorized
-from utils.requester import get_pagination_params, get_sort
-from utils.responser import generate_success_response
+from utils.requester import get_pagination_params, get_sort, get_cursor_param, encode_cursor, get_count_mode, \
+    get_fields_param
+from utils.responser import generate_success_response, generate_not_modified_response, make_etag, is_not_modified
 from utils.schema_validator import validated, UUID_schema
-from validation.user import UPDATE_USER_PROFILE, CREATE_USER_SCHEMA, check_is_new_email
+from validation.user import UPDATE_USER_PROFILE, CREATE_USER_SCHEMA, BULK_CREATE_USER_SCHEMA, BULK_UPDATE_USER_SCHEMA, \
+    check_is_new_email
 
 user_route = Blueprint('user', __name__, url_prefix='/users')
 
 MAP_SORT = {
-    'name': User.name
+    'name': User.name,
+    'created_at': User.created_at
 }
 
 
@@ -35,6 +44,40 @@ def create():
     return generate_success_response(user_created.to_json())
 
 
+@user_route.route('/bulk', methods=['POST'])
+@jwt_required
+@authorized([UserRole.ADMIN.value])
+@validated(BULK_CREATE_USER_SCHEMA)
+@swag_from('../apidocs/user/bulk_create.yml')
+def bulk_create():
+    if len(request.data) > BULK_CREATE_SYNC_MAX_ITEMS:
+        job = bulk_create_users_task.delay(request.data)
+        return generate_success_response({'job_id': job.id, 'status': job.state})
+    results = bulk_create_users(request.data, CREATE_USER_SCHEMA)
+    return generate_success_response(results)
+
+
+@user_route.route('/bulk/<job_id>', methods=['GET'])
+@jwt_required
+@authorized([UserRole.ADMIN.value])
+@swag_from('../apidocs/user/bulk_create_status.yml')
+def bulk_create_status(job_id):
+    job = bulk_create_users_task.AsyncResult(job_id)
+    data = {'job_id': job.id, 'status': job.state}
+    if job.successful():
+        data['results'] = job.result
+    return generate_success_response(data)
+
+
+@user_route.route('/bulk', methods=['PUT'])
+@jwt_required
+@authorized([UserRole.ADMIN.value])
+@validated(BULK_UPDATE_USER_SCHEMA)
+@swag_from('../apidocs/user/bulk_update.yml')
+def bulk_update():
+    return generate_success_response(bulk_update_users(request.data))
+
+
 @user_route.route('', methods=['GET'])
 @jwt_required
 @swag_from('../apidocs/user/get_list.yml')
@@ -42,19 +85,67 @@ def get_list():
     offset, limit = get_pagination_params(request)
     sort_by, sort_type = get_sort(request=request,
                                   map_sort=MAP_SORT,
-                                  default_sort_by='user_created_at')
+                                  default_sort_by=User.created_at)
+    descending = sort_type is desc
+    sort_key = f"{sort_by.key}:{'desc' if descending else 'asc'}"
+    after = get_cursor_param(request, sort_key, [sort_by, User.id])
+    count_mode = get_count_mode(request, COUNT_MODES)
+    fields = get_fields_param(request, User.get_json_columns())
+    etag = None
+    version = get_shared_collection_version(User.__tablename__)
+    if version is not None:
+        # read before the page so a concurrent write can only make the tag older than the data
+        etag = make_etag(User.__tablename__, version, request.query_string.decode())
+        if is_not_modified(etag):
+            return generate_not_modified_response(etag, weak=True)
+    query = filter_users(User.query)
+
+    page_query = query.seek([sort_by, User.id], after=after, descending=descending)
+    if fields is not None:
+        # plain column rows, the cursor keys are selected too so next_cursor can be built
+        selected = fields + [key for key in (sort_by.key, 'id') if key not in fields]
+        page_query = page_query.with_entities(*[getattr(User, key) for key in selected])
+    if after is None and count_mode == 'exact':
+        users, count = page_query.find_page(offset, limit)
+    else:
+        # the window total of a cursor page only covers rows after the cursor
+        count, count_mode = query.count_by(count_mode)
+        if after is None:
+            page_query = page_query.offset(offset)
+        users = page_query.limit(limit).all()
+    next_cursor = None
+    if limit and len(users) == limit:
+        next_cursor = encode_cursor(sort_key, [getattr(users[-1], sort_by.key), users[-1].id])
+    data = User.to_json_many(users) if fields is None else User.rows_to_json(users, fields)
+    return generate_success_response(data=data, offset=offset, limit=limit, total=count, next_cursor=next_cursor,
+                                     total_mode=count_mode, etag=etag, weak_etag=True)
+
+
+@user_route.route('/export', methods=['GET'])
+@jwt_required
+@authorized([UserRole.ADMIN.value])
+@swag_from('../apidocs/user/export.yml')
+def export():
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        raise BadRequest(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    fields = get_fields_param(request, User.get_json_columns()) or User.get_json_columns()
+    query = filter_users(db.session.query(*[getattr(User, field) for field in fields]))
+    generate = generate_csv if export_format == 'csv' else generate_ndjson
+    response = Response(stream_with_context(generate(User, query, fields, EXPORT_BATCH_SIZE)),
+                        mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename=users.{export_format}'
+    return response
+
+
+def filter_users(query):
     role = request.args.get('role', None)
-    query = User.query
     if role is not None:
         query = query.filter(User.role == role)
     status = request.args.get('status', None)
     if status is not None:
         query = query.filter(User.status == status)
-
-    count = query.count()
-    users = query.order_by(sort_type(sort_by)).offset(offset).limit(limit).all()
-    data = [u.to_json() for u in users]
-    return generate_success_response(data=data, offset=offset, limit=limit, total=count)
+    return query
 
 
 @user_route.route('/<user_id>', methods=['GET'])
@@ -62,9 +153,8 @@ def get_list():
 @swag_from('../apidocs/user/get_profile.yml')
 def get_profile(user_id):
     user_id = UUID_schema(user_id)
-    user = get_user_profile_or_404(user_id)
-    data = user.to_json()
-    return generate_success_response(data)
+    fields = get_fields_param(request, User.get_json_columns())
+    return make_profile_response(user_id, fields)
 
 
 @user_route.route('/<uuid:user_id>', methods=['PUT'])
@@ -81,6 +171,7 @@ def update_user_profile(user_id):
         user.set_password(user_info_update['password'])
 
     user.update(data_update=user_info_update, session=db.session)
+    forget_user_role_and_status(user.id)
     user_data = user.to_json()
     user_data['new_password'] = body['password']
     return generate_success_response(user_data)
@@ -91,9 +182,27 @@ def update_user_profile(user_id):
 @swag_from('../apidocs/user/get_me.yml')
 def get_me():
     user_id = get_jwt_identity()
-    user = get_user_profile_or_404(user_id)
-    data = user.to_json()
-    return generate_success_response(data)
+    fields = get_fields_param(request, User.get_json_columns())
+    return make_profile_response(user_id, fields)
+
+
+def make_profile_response(user_id, fields):
+    """
+    Profile response with a strong ETag of id, updated_at and the selected
+    fields. If-None-Match is answered from updated_at alone, so a 304 costs one
+    primary key probe instead of loading and serializing the row.
+    """
+    if request.if_none_match:
+        etag = make_etag(user_id, get_user_updated_at_or_404(user_id), fields)
+        if is_not_modified(etag):
+            return generate_not_modified_response(etag)
+    if fields is not None:
+        data, updated_at = get_user_fields_or_404(user_id, fields)
+    else:
+        user = get_user_profile_or_404(user_id)
+        data = user.to_json()
+        updated_at = user.updated_at
+    return generate_success_response(data, etag=make_etag(user_id, updated_at, fields))
 
 
 @user_route.route('/me', methods=['PUT'])
@@ -114,5 +223,6 @@ def update_me():
 def delete_user(user_id):
     user = get_user_profile_or_404(user_id)
     user.status = UserStatus.BLOCKED.value
-    db.session.commit()
+    revoke_user_tokens(user, session=db.session)
+    forget_user_role_and_status(user.id)
     return generate_success_response()
@@ -18,19 +18,111 @@ class UserStatus(ApacEnum):
     BLOCKED = 'blocked'
 
 
+class UploadSessionStatus(ApacEnum):
+    PENDING = 'pending'
+    COMPLETED = 'completed'
+
+
+class UploadMethod(ApacEnum):
+    POST = 'post'
+    PUT = 'put'
+
+
 EMAIL_ADMIN = os.environ.get('EMAIL_ADMIN', 'admin@gmail.com')
 DEFAULT_PASSWORD_ADMIN = os.environ.get('PASSWORD_ADMIN', 'Admin@123')
 
 OTP_EXPIRY_TIME = 300  # 5 minutes
 FORGOT_PASSWORD_CODE_EXPIRY_TIME = 600  # 10 minutes
+PASSWORD_RESET_PURGE_BATCH_SIZE = 5000
 FRONTEND_ENDPOINT = os.environ.get('FRONTEND_ENDPOINT', 'http://localhost:3000')
 SECRET_KEY = os.environ.get('SECRET_KEY', 'test')
 
 MAX_CONTENT_LENGTH = 5  # 5MB
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'gif', 'svg', 'pdf', 'docx', 'xls', 'xlsx', 'xlsm', 'doc'}
 UPLOAD_FOLDER = 'uploads'
+STREAM_UPLOAD_MAX_SIZE = int(os.environ.get('STREAM_UPLOAD_MAX_SIZE', 1024 * 1024 * 1024))  # raw body uploads
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # bytes held per streamed download
+DOWNLOAD_CACHE_MAX_AGE = 300  # seconds a client reuses a download before revalidating its ETag
+
+# s3 or local, the local backend keeps files under LOCAL_STORAGE_ROOT and serves them from the download route
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND') or 's3'
+LOCAL_STORAGE_ROOT = os.environ.get('LOCAL_STORAGE_ROOT', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))), UPLOAD_FOLDER))
+
+STORAGE_HEAD_CACHE_SIZE = 4096
+STORAGE_HEAD_CACHE_TTL = 60  # seconds, max delay before an upload from another worker is seen
+STORAGE_HEAD_NEGATIVE_TTL = 10  # seconds a missing object is remembered
+
+STORAGE_URL_READ_EXPIRY = int(os.environ.get('STORAGE_URL_READ_EXPIRY', 3600))  # seconds a presigned read url lives
+STORAGE_URL_READ_REUSE_FRACTION = 0.5  # share of that lifetime one url is handed out for
+STORAGE_URL_READ_CACHE_SIZE = 10000
+
+# S3 transfer engine, files above the threshold are sent as parallel multipart parts
+S3_MULTIPART_THRESHOLD = int(os.environ.get('S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024))
+S3_MULTIPART_CHUNKSIZE = int(os.environ.get('S3_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024))
+S3_MAX_CONCURRENCY = int(os.environ.get('S3_MAX_CONCURRENCY', 4))
+S3_MAX_INFLIGHT_BYTES = int(os.environ.get('S3_MAX_INFLIGHT_BYTES', 64 * 1024 * 1024))  # per upload
+
+# direct to bucket uploads, see services.upload_session
+UPLOAD_SESSION_EXPIRY = 900  # seconds the presigned url stays valid
+UPLOAD_SESSION_MAX_SIZE = int(os.environ.get('UPLOAD_SESSION_MAX_SIZE', 1024 * 1024 * 1024))
+UPLOAD_SESSION_GC_GRACE = 3600  # seconds an expired session may still be completed before it is collected
+UPLOAD_SESSION_GC_BATCH_SIZE = 1000  # also the S3 DeleteObjects limit
 
 JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=60)
+JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+
+REDIS_URL = os.environ.get('REDIS_URL')
+
+REVOKED_TOKEN_SYNC_INTERVAL = 5  # seconds, max delay before other workers see a logout
+REVOKED_TOKEN_FILTER_CAPACITY = 100000
+REVOKED_TOKEN_FILTER_ERROR_RATE = 0.001
+REVOKED_TOKEN_LRU_SIZE = 4096
+REVOKED_TOKEN_PURGE_BATCH_SIZE = 5000
+
+USER_TOKEN_EPOCH_CACHE_TTL = 10  # seconds, max delay before other workers see a global logout
+USER_TOKEN_EPOCH_CACHE_SIZE = 10000
+
+AUTHZ_CLAIMS_MAX_AGE = 300  # seconds a role/status claim is trusted without a lookup
+USER_ROLE_CACHE_TTL = 60
+USER_ROLE_CACHE_SIZE = 10000
+
+USER_CACHE_SIZE = 10000
+USER_CACHE_L1_TTL = 5  # seconds, max delay before other workers see a profile change
+USER_CACHE_L2_TTL = 300
+
+EMAIL_NEGATIVE_CACHE_TTL = 30  # seconds an unknown email is answered without a query
+EMAIL_NEGATIVE_CACHE_SIZE = 100000
+EMAIL_FILTER_ENABLED = os.environ.get('EMAIL_FILTER_ENABLED', 'false').lower() == 'true'
+EMAIL_FILTER_SYNC_INTERVAL = 5  # seconds, max delay before other workers see a new email
+EMAIL_FILTER_REBUILD_INTERVAL = 600  # seconds, drops emails that were changed or deleted
+EMAIL_FILTER_CAPACITY = 100000
+EMAIL_FILTER_ERROR_RATE = 0.01
+
+# scrypt cost, raising any of them makes old hashes get rehashed at next login
+PASSWORD_HASH_N = int(os.environ.get('PASSWORD_HASH_N', 2 ** 14))
+PASSWORD_HASH_R = int(os.environ.get('PASSWORD_HASH_R', 8))
+PASSWORD_HASH_P = int(os.environ.get('PASSWORD_HASH_P', 1))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))  # 0 hashes in the request thread
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 32))
+PASSWORD_HASH_TIMEOUT = 10  # seconds
+PASSWORD_HASH_BATCH_TIMEOUT = 20  # seconds, below the gunicorn worker timeout
+
+COUNT_CACHE_TTL = 60  # seconds, upper bound when writes happen outside tracked sessions
+COUNT_CACHE_SIZE = 1024
+COUNT_ESTIMATE_EXACT_BELOW = 10000  # planner estimates under this are replaced by COUNT(*)
+
+BAKED_QUERY_CACHE_SIZE = 200  # compiled statements kept per process
+
+JSON_BACKEND = os.environ.get('JSON_BACKEND', 'json')  # json, orjson or auto (orjson when installed)
+
+EXPORT_BATCH_SIZE = 1000  # rows fetched per server-side cursor round trip
+
+BULK_CREATE_MAX_ITEMS = 50000
+# every item is a scrypt hash, larger batches are created by a Celery task instead of the request
+BULK_CREATE_SYNC_MAX_ITEMS = 200
+BULK_CREATE_CHUNK_SIZE = 200  # rows per hashing batch, INSERT statement and transaction, must fit PASSWORD_HASH_BATCH_TIMEOUT
+BULK_UPDATE_MAX_ITEMS = 50000
 
 SWAGGER_CONFIG = {
     "swagger": "2.0",
@@ -10,11 +10,15 @@ from flask_jwt_extended import JWTManager
 from flask_uploads import patch_request_class
 from sentry_sdk.integrations.flask import FlaskIntegration
 
-from config import SWAGGER_CONFIG, MAX_CONTENT_LENGTH, UPLOAD_FOLDER, JWT_ACCESS_TOKEN_EXPIRES
-from model import RevokedToken
+from config import SWAGGER_CONFIG, MAX_CONTENT_LENGTH, UPLOAD_FOLDER, JWT_ACCESS_TOKEN_EXPIRES, \
+    JWT_REFRESH_TOKEN_EXPIRES
+from services.token_blacklist import is_token_revoked
+from model import User
+from services.token_epoch import is_token_outdated
 from utils.exceptions import register_error_handlers
 from utils.model_encoder import AlchemyEncoder
 from utils.model_session import Session
+from utils.permission import make_access_claims
 from utils.seeder import init_admin
 
 UPLOADS_PATH = join(dirname(realpath(__file__)), UPLOAD_FOLDER + '/')
@@ -39,6 +43,7 @@ def create_app():
 
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'test')
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = JWT_ACCESS_TOKEN_EXPIRES
+    app.config['JWT_REFRESH_TOKEN_EXPIRES'] = JWT_REFRESH_TOKEN_EXPIRES
     jwt = JWTManager(app)
 
     app.config['JWT_BLACKLIST_ENABLED'] = True
@@ -51,7 +56,15 @@ def create_app():
     @jwt.token_in_blacklist_loader
     def check_if_token_in_blacklist(decrypted_token):
         jti = decrypted_token['jti']
-        return RevokedToken.is_jti_blacklisted(jti)
+        return is_token_revoked(jti) or is_token_outdated(decrypted_token)
+
+    @jwt.user_identity_loader
+    def user_identity_lookup(identity):
+        return str(identity.id) if isinstance(identity, User) else identity
+
+    @jwt.user_claims_loader
+    def add_claims_to_access_token(identity):
+        return make_access_claims(identity)
 
     app.json_encoder = AlchemyEncoder
     register_error_handlers(app)
@@ -61,9 +74,13 @@ def create_app():
     with app.app_context():
         from blueprint.auth import auth as auth_route
         from blueprint.user import user_route
+        from blueprint.metrics import metrics_route
+        from blueprint.upload import upload_route
 
         app.register_blueprint(auth_route)
         app.register_blueprint(user_route)
+        app.register_blueprint(metrics_route)
+        app.register_blueprint(upload_route)
 
         init_admin()
 
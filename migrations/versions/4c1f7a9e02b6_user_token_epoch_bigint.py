@@ -0,0 +1,26 @@
+"""user token epoch bigint
+
+Revision ID: 4c1f7a9e02b6
+Revises: bdd2d4bd0919
+Create Date: 2026-10-18 16:41:05.218337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1f7a9e02b6'
+down_revision = 'bdd2d4bd0919'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column('user', 'token_epoch', type_=sa.BigInteger(), existing_type=sa.Integer(),
+                    existing_nullable=False, existing_server_default='0')
+
+
+def downgrade():
+    op.alter_column('user', 'token_epoch', type_=sa.Integer(), existing_type=sa.BigInteger(),
+                    existing_nullable=False, existing_server_default='0')
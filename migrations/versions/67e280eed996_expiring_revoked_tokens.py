@@ -0,0 +1,43 @@
+"""expiring revoked tokens
+
+Revision ID: 67e280eed996
+Revises: 5009d850f612
+Create Date: 2026-10-18 09:12:44.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '67e280eed996'
+down_revision = '5009d850f612'
+branch_labels = None
+depends_on = None
+
+# Existing rows never recorded the token expiry, keep them for the longest
+# token lifetime (JWT_REFRESH_TOKEN_EXPIRES) so no revoked token comes back.
+LEGACY_TOKEN_LIFETIME = "interval '30 days'"
+
+
+def upgrade():
+    op.add_column('revoked_tokens', sa.Column('expires_at', sa.DateTime(), nullable=True))
+    op.execute(
+        f"UPDATE revoked_tokens SET expires_at = (now() at time zone 'utc') + {LEGACY_TOKEN_LIFETIME}"
+    )
+    op.execute("DELETE FROM revoked_tokens WHERE jti IS NULL")
+    op.execute(
+        "DELETE FROM revoked_tokens a USING revoked_tokens b "
+        "WHERE a.jti = b.jti AND a.id > b.id"
+    )
+    op.alter_column('revoked_tokens', 'expires_at', nullable=False)
+    op.alter_column('revoked_tokens', 'jti', existing_type=sa.String(length=120), nullable=False)
+    op.create_index(op.f('ix_revoked_tokens_jti'), 'revoked_tokens', ['jti'], unique=True)
+    op.create_index(op.f('ix_revoked_tokens_expires_at'), 'revoked_tokens', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_revoked_tokens_expires_at'), table_name='revoked_tokens')
+    op.drop_index(op.f('ix_revoked_tokens_jti'), table_name='revoked_tokens')
+    op.alter_column('revoked_tokens', 'jti', existing_type=sa.String(length=120), nullable=True)
+    op.drop_column('revoked_tokens', 'expires_at')
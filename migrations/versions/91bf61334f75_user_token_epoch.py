@@ -0,0 +1,24 @@
+"""user token epoch
+
+Revision ID: 91bf61334f75
+Revises: 67e280eed996
+Create Date: 2026-10-18 10:02:17.553912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '91bf61334f75'
+down_revision = '67e280eed996'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user', sa.Column('token_epoch', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('user', 'token_epoch')
@@ -0,0 +1,44 @@
+"""hashed expiring password reset codes
+
+Revision ID: e2ff425c9eb5
+Revises: eee063dbac82
+Create Date: 2026-10-18 14:26:03.774150
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2ff425c9eb5'
+down_revision = 'eee063dbac82'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('password_reset_codes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('code_hash', sa.String(length=64), nullable=False),
+    sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], name=op.f('fk_password_reset_codes_user_id_user'),
+                            ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_password_reset_codes'))
+    )
+    op.create_index(op.f('ix_password_reset_codes_code_hash'), 'password_reset_codes', ['code_hash'], unique=True)
+    op.create_index(op.f('ix_password_reset_codes_user_id'), 'password_reset_codes', ['user_id'], unique=False)
+    op.create_index(op.f('ix_password_reset_codes_expires_at'), 'password_reset_codes', ['expires_at'],
+                    unique=False)
+    # plain text codes that never expired, outstanding ones have to be requested again
+    op.drop_column('user', 'set_password_code')
+
+
+def downgrade():
+    op.add_column('user', sa.Column('set_password_code', sa.String(), nullable=True))
+    op.drop_index(op.f('ix_password_reset_codes_expires_at'), table_name='password_reset_codes')
+    op.drop_index(op.f('ix_password_reset_codes_user_id'), table_name='password_reset_codes')
+    op.drop_index(op.f('ix_password_reset_codes_code_hash'), table_name='password_reset_codes')
+    op.drop_table('password_reset_codes')
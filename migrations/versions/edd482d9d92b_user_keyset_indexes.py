@@ -0,0 +1,26 @@
+"""user keyset pagination indexes
+
+Revision ID: edd482d9d92b
+Revises: 91bf61334f75
+Create Date: 2026-10-18 11:24:05.170344
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'edd482d9d92b'
+down_revision = '91bf61334f75'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_user_name_id', 'user', ['name', 'id'], unique=False)
+    op.create_index('ix_user_created_at_id', 'user', ['created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_user_created_at_id', table_name='user')
+    op.drop_index('ix_user_name_id', table_name='user')
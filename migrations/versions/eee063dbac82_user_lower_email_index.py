@@ -0,0 +1,24 @@
+"""user lower(email) index
+
+Revision ID: eee063dbac82
+Revises: edd482d9d92b
+Create Date: 2026-10-18 13:41:52.208416
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'eee063dbac82'
+down_revision = 'edd482d9d92b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_user_lower_email', 'user', [sa.text('lower(email)')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_user_lower_email', table_name='user')
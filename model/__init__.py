@@ -1,2 +1,4 @@
+from .password_reset_code import PasswordResetCode
 from .token_revoke import RevokedToken
+from .upload_session import UploadSession
 from .user import User
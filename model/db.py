@@ -1,14 +1,32 @@
 import datetime
 import enum
+import json
 import uuid
+from operator import attrgetter
 
 from flask_sqlalchemy import Model, SQLAlchemy, BaseQuery
-from sqlalchemy import MetaData, func, desc, asc
+from sqlalchemy import MetaData, Boolean, DateTime, Enum, Integer, String, func, desc, asc, literal, tuple_, and_
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext import baked
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.inspection import inspect as sa_inspect
+from sqlalchemy.orm import scoped_session
 
+from config import COUNT_CACHE_SIZE, COUNT_CACHE_TTL, COUNT_ESTIMATE_EXACT_BELOW, BAKED_QUERY_CACHE_SIZE
+from services.collection_version import get_collection_version, mark_collection_written
+from services.model_cache import invalidate_on_commit
+from utils import metrics
+from utils.cache import TTLCache
 from utils.exceptions import BadRequest
 
+COUNT_MODES = ('exact', 'cached', 'estimated')
+_count_cache = TTLCache(maxsize=COUNT_CACHE_SIZE, ttl=COUNT_CACHE_TTL)
+_bakery = baked.bakery(size=BAKED_QUERY_CACHE_SIZE)
+
+# how a compiled json plan turns an attribute into its json value
+ENCODE_AS_IS, ENCODE_STR, ENCODE_GENERIC, ENCODE_MODIFIER = range(4)
+_json_plans = {}
+
 
 def generate_json(obj, deep=True, options: dict = None):
     if hasattr(obj, "to_json") and deep:
@@ -56,31 +74,102 @@ class JsonSerializer(object):
             if type(p) == hybrid_property:
                 yield p.__name__
 
+    @classmethod
+    def get_json_plan(cls):
+        """
+        The public, hidden and modifier rules of the class resolved once into a
+        tuple of ``(key, getter, kind, modifier)``, so serializing a row no
+        longer walks the mapper or re-applies the rules.
+        """
+        plan = _json_plans.get(cls)
+        if plan is None:
+            plan = _json_plans[cls] = cls._compile_json_plan()
+        return plan
+
+    @classmethod
+    def _compile_json_plan(cls):
+        mapper = sa_inspect(cls)
+        field_names = [p.key for p in mapper.iterate_properties]
+        field_names += [p.__name__ for p in mapper.all_orm_descriptors if type(p) == hybrid_property]
+        public = list(cls.__json_public__ or field_names)
+        hidden = set(cls.__json_hidden__ or [])
+        modifiers = cls.__json_modifiers__ or dict()
+        columns = mapper.columns
+        plan = []
+        for key in public + [key for key in modifiers if key not in public]:
+            if key in hidden:
+                continue
+            if key in modifiers:
+                kind = ENCODE_MODIFIER
+            elif key in columns:
+                kind = _column_encoding(columns[key].type)
+            else:
+                kind = ENCODE_GENERIC
+            plan.append((key, attrgetter(key), kind, modifiers.get(key)))
+        return tuple(plan)
+
     def to_json(self, deep=True, options: dict = None):
-        field_names = self.get_field_names()
-
-        public = self.__json_public__ or field_names
-        hidden = self.__json_hidden__ or []
-        modifiers = self.__json_modifiers__ or dict()
-        rv = dict()
-        for key in public:
-            rv[key] = getattr(self, key)
-        for key, modifier in modifiers.items():
-            value = getattr(self, key)
-            rv[key] = modifier(value, self)
-        for key in hidden:
-            rv.pop(key, None)
-        return generate_json(rv, deep=deep, options=options)
+        return _apply_json_plan(self, self.get_json_plan(), deep)
+
+    @classmethod
+    def get_json_columns(cls):
+        """Public, unmodified columns: the ones that can be selected without loading the model."""
+        columns = cls.__mapper__.columns
+        return [key for key, _, kind, _ in cls.get_json_plan() if kind != ENCODE_MODIFIER and key in columns]
+
+    @classmethod
+    def rows_to_json(cls, rows, fields, deep=True):
+        """Serializes rows of selected columns the way to_json serializes the same keys."""
+        plan = tuple((key, attrgetter(key), kind, None) for key, _, kind, _ in cls.get_json_plan() if key in fields)
+        return [_apply_json_plan(row, plan, deep) for row in rows]
+
+    @classmethod
+    def to_json_many(cls, objects, deep=True, options: dict = None):
+        plans = _json_plans
+        return [_apply_json_plan(obj, plans.get(obj.__class__) or obj.get_json_plan(), deep) for obj in objects]
+
+
+def _column_encoding(column_type):
+    # mirrors generate_json for the values each column type can hold
+    if isinstance(column_type, Enum):
+        return ENCODE_GENERIC
+    if isinstance(column_type, (String, Integer, Boolean, DateTime)):
+        return ENCODE_AS_IS
+    if isinstance(column_type, UUID):
+        return ENCODE_STR
+    return ENCODE_GENERIC
+
+
+def _apply_json_plan(obj, plan, deep):
+    rv = {}
+    for key, getter, kind, modifier in plan:
+        value = getter(obj)
+        if kind == ENCODE_MODIFIER:
+            rv[key] = generate_json(modifier(value, obj), deep=deep)
+        elif kind == ENCODE_AS_IS or value is None:
+            rv[key] = value
+        elif kind == ENCODE_STR:
+            rv[key] = str(value)
+        else:
+            rv[key] = generate_json(value, deep=deep)
+    return rv
 
 
 class ModelGeneralTasks(object):
     __update_field__ = None
+    __cache__ = None  # a services.model_cache.ModelCache, see cache_model
+
+    def invalidate_cache(self, session):
+        """Drops the cached row once ``session`` commits, so readers never refill it with the old values."""
+        if self.__cache__ is not None:
+            invalidate_on_commit(session, self.__cache__, [self.__cache__.key_of(self)])
 
     def save(self, session=None, is_commit=True):
         if not session:
             session = sa_inspect(self).session
         try:
             session.add(self)
+            self.invalidate_cache(session)
             if is_commit:
                 session.commit()
         except Exception as e:
@@ -93,6 +182,7 @@ class ModelGeneralTasks(object):
             session = sa_inspect(self).session
         try:
             session.delete(self)
+            self.invalidate_cache(session)
             if is_commit:
                 session.commit()
         except Exception as error:
@@ -106,15 +196,104 @@ class ModelGeneralTasks(object):
         for k, v in data_update.items():
             if k in fields_can_update:
                 setattr(self, k, v)
+        self.invalidate_cache(session)
+        try:
+            if is_commit:
+                session.commit()
+        except Exception as error:
+            session.rollback()
+            raise error
+
+    @classmethod
+    def bulk_update(cls, data_update, *criteria, session=None, is_commit=True, returning=None, server_values=None):
+        """
+        Set-based counterpart of update: one ``UPDATE ... WHERE criteria
+        RETURNING`` instead of loading and flushing every row. Unlike update,
+        a key outside ``__update_field__`` is rejected rather than ignored.
+        ``server_values`` are columns computed by the caller, written as given.
+
+        Returns the rows of ``returning`` (the primary key by default) for every
+        updated row. For a cached model the primary key is added to
+        ``returning`` so the rows can be invalidated. Instances already loaded
+        in the session are not refreshed until the commit expires them.
+        """
+        session = session or cls.query.session
+        fields_can_update = cls.__update_field__ or list()
+        forbidden = [k for k in data_update if k not in fields_can_update]
+        if forbidden:
+            raise BadRequest(f"{', '.join(forbidden)} can not be updated")
+        values = dict(data_update)
+        values.update(server_values or {})
+        if not values:
+            raise BadRequest('nothing to update')
+        table = cls.__table__
+        returning = list(returning or table.primary_key.columns)
+        if cls.__cache__ is not None and cls.__cache__.pk_column not in returning:
+            returning.append(cls.__cache__.pk_column)
+        statement = table.update().where(and_(*criteria)).values(values).returning(*returning)
         try:
+            rows = session.execute(statement).fetchall()
+            if rows:
+                mark_collection_written(session, table.name)
+                if cls.__cache__ is not None:
+                    invalidate_on_commit(session, cls.__cache__, [row[cls.__cache__.pk_column] for row in rows])
             if is_commit:
                 session.commit()
         except Exception as error:
             session.rollback()
             raise error
+        return rows
+
+    @classmethod
+    def delete_expired(cls, expires_column, batch_size, now=None, session=None):
+        """
+        Deletes rows whose ``expires_column`` is in the past in chunks of
+        ``batch_size``, committing after every chunk so no statement holds row
+        locks for long. Returns the number of deleted rows.
+        """
+        session = session or cls.query.session
+        now = now or datetime.datetime.utcnow()
+        pk_column = sa_inspect(cls).primary_key[0]
+        deleted = 0
+        while True:
+            expired_ids = session.query(pk_column) \
+                .filter(expires_column < now) \
+                .limit(batch_size) \
+                .subquery()
+            count = session.query(cls).filter(pk_column.in_(expired_ids)).delete(synchronize_session=False)
+            session.commit()
+            deleted += count
+            if count < batch_size:
+                return deleted
 
 
 class PowerPaintQuery(BaseQuery):
+    baked_queries = {}
+
+    @classmethod
+    def bake(cls, name, build):
+        """
+        Registers ``build(session)`` as the named query ``name`` and returns a
+        function running it: ``run(session=None, **params)`` gives a result
+        with first, one_or_none, all and scalar. The query is built and its SQL
+        compiled once, later calls only bind ``params``, so ``build`` must
+        take every varying value from a ``bindparam`` and never close over one.
+        """
+        # the name joins the cache key, builds sharing a code object stay apart
+        baked_query = _bakery(build, name)
+
+        def run(session=None, **params):
+            # baked queries need the Session itself, db.session is a scoped_session proxy
+            if session is None:
+                session = db.session()
+            elif isinstance(session, scoped_session):
+                session = session()
+            return baked_query(session).params(**params)
+
+        run.__name__ = name
+        cls.baked_queries[name] = run
+        return run
+
     def find_by_id(self, id):
         return self.get(id)
 
@@ -131,7 +310,7 @@ class PowerPaintQuery(BaseQuery):
         offset, limit = self.validate_offset_limit(offset, limit)
         return self.order_by(order).offset(offset).limit(limit).all()
 
-    def find_all_with_attributes(self, model, attributes):
+    def find_all_with_attributes(self, model, attributes, count_mode='exact'):
         cmd_query = self
         field_can_filter = model.__filter_field__ or list()
         offset = attributes.pop('offset', 0)
@@ -151,10 +330,70 @@ class PowerPaintQuery(BaseQuery):
             cmd_query = cmd_query.order_by(desc(order_by))
         else:
             cmd_query = cmd_query.order_by(asc(order_by))
+        if count_mode == 'exact':
+            return cmd_query.find_page(offset, limit)
         items = cmd_query.offset(offset).limit(limit).all()
-        count = cmd_query.count()
+        count, _ = cmd_query.count_by(count_mode)
         return items, count
 
+    def find_page(self, offset=0, limit=10):
+        """
+        Fetches one page together with the total number of matching rows in a
+        single statement by adding COUNT(*) OVER() to every row. A separate
+        COUNT(*) is only sent when a page past the first comes back empty,
+        since there is then no row to carry the window total.
+
+        Returns ``(items, total)``. Items are model instances for a model query,
+        column queries get their rows back with the extra ``total_count``.
+        """
+        descriptions = self.column_descriptions
+        rows = self.add_columns(func.count().over().label('total_count')) \
+            .offset(offset).limit(limit).all()
+        if not rows:
+            return [], self.count() if offset else 0
+        total = rows[0][-1]
+        if len(descriptions) == 1 and hasattr(descriptions[0]['type'], '__mapper__'):
+            return [row[0] for row in rows], total
+        return rows, total
+
+    def count_by(self, mode='exact'):
+        """
+        Counts the rows of this query with one of COUNT_MODES:
+
+        * ``exact`` runs COUNT(*),
+        * ``cached`` memoizes the exact count per statement and parameters until
+          a commit writes the table (see services.collection_version),
+        * ``estimated`` reads the planner row estimate, falling back to an exact
+          count when the estimate is small enough for COUNT(*) to be cheap.
+
+        Returns ``(total, mode)`` where ``mode`` is the one that produced total.
+        """
+        if mode == 'cached':
+            compiled = self.statement.compile()
+            table = self._bind_mapper().local_table.name
+            key = (table, get_collection_version(table), str(compiled), repr(sorted(compiled.params.items())))
+            total = _count_cache.get(key)
+            if total is not None:
+                metrics.incr('count.cache_hit')
+                return total, 'cached'
+            metrics.incr('count.cache_miss')
+            total = self.count()
+            _count_cache.set(key, total)
+            return total, 'cached'
+        if mode == 'estimated':
+            total = self.estimate_count()
+            if total >= COUNT_ESTIMATE_EXACT_BELOW:
+                return total, 'estimated'
+        return self.count(), 'exact'
+
+    def estimate_count(self):
+        connection = self.session.connection()
+        compiled = self.order_by(None).statement.compile(dialect=connection.dialect)
+        plan = connection.execute('EXPLAIN (FORMAT JSON) ' + str(compiled), compiled.params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
     @staticmethod
     def find_all_and_count_with_cmd_query_and_model(
             model, cmd_query, attributes):
@@ -173,6 +412,24 @@ class PowerPaintQuery(BaseQuery):
         offset, limit = self.validate_offset_limit(offset, limit)
         return self.filter(filter).order_by(order).offset(offset).limit(limit).all()
 
+    def seek(self, columns, after=None, descending=True):
+        """
+        Keyset pagination: orders by ``columns`` (the sort column followed by a
+        unique tie breaker such as the primary key) and keeps only rows that
+        come strictly after the ``after`` values, so deep pages cost an index
+        probe instead of scanning every skipped row. ``after`` must already
+        hold values of the column types, see utils.requester.get_cursor_param.
+        """
+        query = self
+        if after is not None:
+            if len(after) != len(columns):
+                raise BadRequest('cursor is invalid')
+            values = [literal(value, type_=column.type) for column, value in zip(columns, after)]
+            key, bound = tuple_(*columns), tuple_(*values)
+            query = query.filter(key < bound if descending else key > bound)
+        order = desc if descending else asc
+        return query.order_by(*[order(column) for column in columns])
+
     def get_or_404(self, id, custom_message=None):
         data = self.get(id)
         if data is None:
@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from sqlalchemy.dialects.postgresql import UUID
+
+from model.db import db
+from utils.hash_util import hash_sha256
+
+
+class PasswordResetCode(db.Model):
+    """A password reset code, only its sha256 is stored so a database leak can not be used to reset accounts."""
+    __tablename__ = 'password_reset_codes'
+    id = db.Column(db.Integer, primary_key=True)
+    code_hash = db.Column(db.String(64), nullable=False, unique=True, index=True)
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @staticmethod
+    def hash_code(code):
+        return hash_sha256(code)
+
+    @classmethod
+    def purge_expired(cls, batch_size, now=None):
+        return cls.delete_expired(cls.expires_at, batch_size, now=now)
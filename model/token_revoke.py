@@ -1,10 +1,13 @@
-from model.db import db
+from sqlalchemy import bindparam
+
+from model.db import db, PowerPaintQuery
 
 
 class RevokedToken(db.Model):
     __tablename__ = 'revoked_tokens'
     id = db.Column(db.Integer, primary_key=True)
-    jti = db.Column(db.String(120))
+    jti = db.Column(db.String(120), nullable=False, unique=True, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
 
     def add(self):
         db.session.add(self)
@@ -12,5 +15,14 @@ class RevokedToken(db.Model):
 
     @classmethod
     def is_jti_blacklisted(cls, jti):
-        query = cls.query.filter_by(jti=jti).first()
-        return bool(query)
+        return _find_id_by_jti(jti=jti).first() is not None
+
+    @classmethod
+    def purge_expired(cls, batch_size, now=None):
+        return cls.delete_expired(cls.expires_at, batch_size, now=now)
+
+
+_find_id_by_jti = PowerPaintQuery.bake(
+    'revoked_token.find_id_by_jti',
+    lambda session: session.query(RevokedToken.id).filter(RevokedToken.jti == bindparam('jti'))
+)
@@ -0,0 +1,34 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy.dialects.postgresql import UUID
+
+from config import UploadSessionStatus
+from model.db import db
+
+
+class UploadSession(db.Model):
+    """A presigned upload handed to a client, completed once the object is verified in the bucket."""
+    __tablename__ = 'upload_sessions'
+    __update_field__ = [
+        'status',
+        'size',
+        'etag',
+        'completed_at'
+    ]
+    __table_args__ = (
+        # garbage collection of abandoned sessions
+        db.Index('ix_upload_sessions_status_expires_at', 'status', 'expires_at'),
+    )
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    key = db.Column(db.String, nullable=False, unique=True)
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    method = db.Column(db.String, nullable=False)
+    content_type = db.Column(db.String, nullable=False)
+    max_size = db.Column(db.BigInteger, nullable=False)
+    status = db.Column(db.String, nullable=False, default=UploadSessionStatus.PENDING.value)
+    size = db.Column(db.BigInteger)
+    etag = db.Column(db.String)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
@@ -1,26 +1,34 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, String
+from sqlalchemy import BigInteger, Column, DateTime, Index, String, func
 from sqlalchemy.dialects.postgresql import UUID
 
 from model.db import db
-from utils.hash_util import hash_password, check_password
-from config import UserStatus
+from services.collection_version import track_collection
+from services.model_cache import cache_model
+from services.password_hasher import password_hasher
+from config import UserStatus, USER_CACHE_SIZE, USER_CACHE_L1_TTL, USER_CACHE_L2_TTL
 
 
 class User(db.Model):
     __tablename__ = 'user'
     __json_hidden__ = [
         'password_hash',
-        'set_password_code',
-        'request_forgot_password_at'
+        'request_forgot_password_at',
+        'token_epoch'
     ]
     __update_field__ = [
         'email',
         'name',
-        'role'
+        'role',
+        'status'
     ]
+    __table_args__ = (
+        # keyset pagination of GET /users, one per sortable column
+        Index('ix_user_name_id', 'name', 'id'),
+        Index('ix_user_created_at_id', 'created_at', 'id'),
+    )
     # Columns
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     email = Column(String, nullable=False, unique=True)
@@ -30,7 +38,7 @@ class User(db.Model):
     name = Column(String, nullable=False)
 
     request_forgot_password_at = Column(DateTime)
-    set_password_code = Column(String)
+    token_epoch = Column(BigInteger, nullable=False, default=0, server_default='0')
 
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -40,7 +48,25 @@ class User(db.Model):
         super(User, self).__init__(**kwargs)
 
     def set_password(self, password):
-        self.password_hash = hash_password(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+
+    def rehash_password_if_needed(self, password):
+        """Upgrades a hash made with old KDF parameters, call only after check_password succeeded."""
+        if not password_hasher.needs_rehash(self.password_hash):
+            return False
+        self.set_password(password)
+        return True
+
+
+# case insensitive email lookups of services.user and services.email_index
+Index('ix_user_lower_email', func.lower(User.email))
+# keyset pagination of the user list, see PowerPaintQuery.seek
+Index('ix_user_name_id', User.name, User.id)
+Index('ix_user_created_at_id', User.created_at, User.id)
+
+track_collection(User)
+cache_model(User, USER_CACHE_SIZE, USER_CACHE_L1_TTL, USER_CACHE_L2_TTL,
+            exclude=['password_hash'])
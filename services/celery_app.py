@@ -12,6 +12,10 @@ def make_celery(app):
         imports=(),
         include=[
             'tasks.mail',
+            'tasks.token',
+            'tasks.password_reset',
+            'tasks.upload',
+            'tasks.user',
         ]
     )
     celery.conf.update(app.config)
@@ -27,6 +31,21 @@ def make_celery(app):
             'schedule': crontab(hour=18, minute=16),
             'args': (),
         },
+        'purge_expired_revoked_tokens': {
+            'task': 'tasks.token.purge_expired_revoked_tokens',
+            'schedule': crontab(minute=0),
+            'args': (),
+        },
+        'purge_expired_reset_codes': {
+            'task': 'tasks.password_reset.purge_expired_reset_codes',
+            'schedule': crontab(minute=30),
+            'args': (),
+        },
+        'purge_abandoned_upload_sessions': {
+            'task': 'tasks.upload.purge_abandoned_upload_sessions',
+            'schedule': crontab(minute=15),
+            'args': (),
+        },
     }
 
     TaskBase = celery.Task
@@ -0,0 +1,81 @@
+"""Per-table write counters
+
+Every commit that inserts, updates or deletes rows of a tracked model bumps
+the version of its table, so anything derived from the whole collection
+(cached counts, list ETags) can be keyed by version instead of being
+invalidated by hand.
+"""
+import threading
+from collections import defaultdict
+
+from redis import RedisError
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from services.redis_client import get_redis
+from utils import metrics
+
+REDIS_KEY = 'collection_version'
+SESSION_KEY = 'written_collections'
+
+_lock = threading.Lock()
+_local_versions = defaultdict(int)
+
+
+def get_collection_version(name):
+    version = get_shared_collection_version(name)
+    return _local_versions[name] if version is None else version
+
+
+def get_shared_collection_version(name):
+    """The version every worker agrees on, or None when only this worker's counter is available."""
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        return int(client.hget(REDIS_KEY, name) or 0)
+    except RedisError:
+        metrics.incr('collection_version.redis_error')
+        return None
+
+
+def bump_collection_version(name):
+    with _lock:
+        _local_versions[name] += 1
+    client = get_redis()
+    if client is not None:
+        try:
+            client.hincrby(REDIS_KEY, name, 1)
+        except RedisError:
+            metrics.incr('collection_version.redis_error')
+
+
+def mark_collection_written(session, name):
+    """For writes the ORM does not see, e.g. Core inserts, the version is bumped at commit."""
+    if session is not None:
+        session.info.setdefault(SESSION_KEY, set()).add(name)
+
+
+def track_collection(model):
+    def on_row_written(mapper, connection, target):
+        mark_collection_written(object_session(target), model.__tablename__)
+
+    for event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, event_name, on_row_written)
+
+
+@event.listens_for(Session, 'after_bulk_update')
+@event.listens_for(Session, 'after_bulk_delete')
+def _on_bulk_write(context):
+    mark_collection_written(context.session, context.mapper.local_table.name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _on_commit(session):
+    for name in session.info.pop(SESSION_KEY, ()):
+        bump_collection_version(name)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _on_rollback(session, previous_transaction):
+    session.info.pop(SESSION_KEY, None)
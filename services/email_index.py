@@ -0,0 +1,166 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import event, func
+from sqlalchemy.orm.attributes import get_history
+
+from config import EMAIL_NEGATIVE_CACHE_TTL, EMAIL_NEGATIVE_CACHE_SIZE, EMAIL_FILTER_ENABLED, \
+    EMAIL_FILTER_SYNC_INTERVAL, EMAIL_FILTER_REBUILD_INTERVAL, EMAIL_FILTER_CAPACITY, EMAIL_FILTER_ERROR_RATE
+from model import User
+from model.db import db
+from utils import metrics
+from utils.bloom_filter import BloomFilter
+from utils.cache import TTLCache
+
+SYNC_OVERLAP = timedelta(seconds=2)  # re-read on every sync to absorb commits that landed out of created_at order
+REBUILD_BATCH_SIZE = 10000
+
+
+class EmailIndex(object):
+    """
+    Answers "no user has this email" without a query when it can, by asking
+
+    1. a bloom filter of every existing email, when EMAIL_FILTER_ENABLED,
+    2. a short lived cache of emails recently found unknown,
+
+    before the ``lower(email)`` index. Emails created by this worker are seen
+    at once. Other workers see them after at most ``sync_interval`` seconds
+    through the filter and ``negative_ttl`` through the cache, inserts racing
+    that window are still stopped by the unique constraint on email.
+
+    The filter is built from the whole table by a background thread, requests
+    only pull the emails created since the last sync and ask the index until
+    the first build is done.
+    """
+
+    def __init__(self, negative_ttl=EMAIL_NEGATIVE_CACHE_TTL, negative_size=EMAIL_NEGATIVE_CACHE_SIZE,
+                 use_filter=EMAIL_FILTER_ENABLED, sync_interval=EMAIL_FILTER_SYNC_INTERVAL,
+                 rebuild_interval=EMAIL_FILTER_REBUILD_INTERVAL, capacity=EMAIL_FILTER_CAPACITY,
+                 error_rate=EMAIL_FILTER_ERROR_RATE):
+        self.unknown = TTLCache(maxsize=negative_size, ttl=negative_ttl)
+        self.use_filter = use_filter
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bloom = None
+        self.synced_at = 0
+        self.rebuilt_at = 0
+        self.last_created_at = None
+        self.rebuilding = False
+        self.rebuild_started_at = 0
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        metrics.track_ratio('email_lookup.skip_ratio',
+                            hits=['email_lookup.filter_negative', 'email_lookup.negative_hit'],
+                            misses=['email_lookup.db_lookup'])
+        metrics.track_gauge('email_lookup.negative_cache_size', lambda: len(self.unknown))
+        metrics.track_gauge('email_lookup.filter_count', lambda: self.bloom.count if self.bloom else None)
+
+    def is_unknown(self, email):
+        """True when no user has ``email``, False when the database has to be asked."""
+        bloom = self._sync()
+        if bloom is not None and email not in bloom:
+            metrics.incr('email_lookup.filter_negative')
+            return True
+        if email in self.unknown:
+            metrics.incr('email_lookup.negative_hit')
+            return True
+        metrics.incr('email_lookup.db_lookup')
+        return False
+
+    def remember_unknown(self, email):
+        self.unknown.set(email, True)
+
+    def added(self, emails):
+        bloom = self.bloom
+        for email in emails:
+            self.unknown.pop(email)
+            if bloom is not None:
+                bloom.add(email)
+
+    def _sync(self):
+        """Returns the filter, or None while it is first being built."""
+        if not self.use_filter:
+            return None
+        now = time.time()
+        bloom = self.bloom
+        if bloom is None or bloom.is_full() or now - self.rebuilt_at >= self.rebuild_interval:
+            # rebuilds also forget emails that were changed or deleted since
+            self._start_rebuild(now)
+        if bloom is None or now - self.synced_at < self.sync_interval:
+            return bloom
+        if not self._lock.acquire(blocking=False):
+            # another thread is syncing, the current filter is still within the staleness bound
+            return bloom
+        try:
+            self._pull()
+            self.synced_at = now
+            metrics.incr('email_lookup.filter_sync')
+            return self.bloom
+        finally:
+            self._lock.release()
+
+    def _start_rebuild(self, now):
+        with self._rebuild_lock:
+            # a failed rebuild is retried after sync_interval, not on every request
+            if self.rebuilding or now - self.rebuild_started_at < self.sync_interval:
+                return
+            self.rebuilding = True
+            self.rebuild_started_at = now
+        app = current_app._get_current_object()
+        threading.Thread(target=self._rebuild, args=(app,), name='email-index-rebuild', daemon=True).start()
+
+    def _rebuild(self, app):
+        try:
+            with app.app_context():
+                try:
+                    bloom, last_created_at = self._build()
+                finally:
+                    db.session.remove()
+            with self._lock:
+                self.bloom = bloom
+                self.last_created_at = last_created_at
+                self.rebuilt_at = time.time()
+                # the next request pulls what was committed while the table was read
+                self.synced_at = 0
+            metrics.incr('email_lookup.filter_rebuild')
+        except Exception:
+            metrics.incr('email_lookup.filter_rebuild_error')
+            logging.exception('email index rebuild failed')
+        finally:
+            self.rebuilding = False
+
+    def _build(self):
+        total = db.session.query(func.count(User.id)).scalar()
+        bloom = BloomFilter(max(self.capacity, 2 * total), self.error_rate)
+        last_created_at = None
+        query = db.session.query(func.lower(User.email), User.created_at).yield_per(REBUILD_BATCH_SIZE)
+        for email, created_at in query:
+            bloom.add(email)
+            if created_at is not None and (last_created_at is None or created_at > last_created_at):
+                last_created_at = created_at
+        return bloom, last_created_at
+
+    def _pull(self):
+        query = db.session.query(func.lower(User.email), User.created_at)
+        if self.last_created_at is not None:
+            # served by ix_user_created_at_id
+            query = query.filter(User.created_at >= self.last_created_at - SYNC_OVERLAP)
+        for email, created_at in query:
+            self.bloom.add(email)
+            if created_at is not None and (self.last_created_at is None or created_at > self.last_created_at):
+                self.last_created_at = created_at
+
+
+email_index = EmailIndex()
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+def _on_user_written(mapper, connection, target):
+    if target.email is not None and get_history(target, 'email').added:
+        email_index.added([target.email.lower()])
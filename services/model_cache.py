@@ -0,0 +1,196 @@
+"""Read-through cache of model rows
+
+Rows are cached by primary key as plain column values, in a per-worker TTL
+LRU in front of Redis in front of the database. Concurrent misses of one key
+in a worker share a single load. Callers get an instance merged into their
+own session without a query, which can be updated and committed as if it had
+been loaded.
+
+Writes invalidate a row once their transaction commits. Other workers may
+keep serving their in-process copy for up to ``l1_ttl`` seconds.
+"""
+import datetime
+import json
+import threading
+import uuid
+from collections import defaultdict
+
+from redis import RedisError
+from sqlalchemy import DateTime, bindparam, event
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.inspection import inspect as sa_inspect
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from services.redis_client import get_redis
+from utils import metrics
+from utils.cache import TTLCache
+from utils.single_flight import SingleFlight
+
+SESSION_KEY = 'invalidated_cache_keys'
+TOMBSTONE = b'-'
+TOMBSTONE_MS = 5000  # an invalidated Redis entry refuses refills that may have read the old row for this long
+
+
+class ModelCache(object):
+    def __init__(self, model, l1_size, l1_ttl, l2_ttl, exclude=()):
+        mapper = sa_inspect(model)
+        self.model = model
+        self.name = model.__tablename__
+        self.pk_column = mapper.primary_key[0]
+        self.pk_key = mapper.get_property_by_column(self.pk_column).key
+        # excluded columns, e.g. secrets, are left unloaded and fetched on first access
+        self.keys = [p.key for p in mapper.column_attrs if p.key not in exclude]
+        self.exclude = list(exclude)
+        self.decoders = {}
+        for key in self.keys:
+            column_type = mapper.columns[key].type
+            if isinstance(column_type, DateTime):
+                self.decoders[key] = datetime.datetime.fromisoformat
+            elif isinstance(column_type, UUID) and column_type.as_uuid:
+                self.decoders[key] = uuid.UUID
+        self._find_values = model.query_class.bake(
+            f'{self.name}_cache.load',
+            lambda session: session.query(*[getattr(model, k) for k in self.keys])
+            .filter(self.pk_column == bindparam('key'))
+        )
+        self.l1 = TTLCache(maxsize=l1_size, ttl=l1_ttl)
+        self.l2_ttl = l2_ttl
+        self.flight = SingleFlight()
+        self._generation = 0
+        self._lock = threading.Lock()
+        metrics.track_ratio(f'{self.name}_cache.hit_ratio',
+                            hits=[f'{self.name}_cache.l1_hit', f'{self.name}_cache.l2_hit'],
+                            misses=[f'{self.name}_cache.miss'])
+
+    def get(self, key, session):
+        """The instance with primary key ``key`` attached to ``session``, or None when there is no such row."""
+        values = self.get_values(key, session)
+        if values is None:
+            return None
+        obj = self.model.__mapper__.class_manager.new_instance()
+        for k, v in values.items():
+            set_committed_value(obj, k, v)
+        make_transient_to_detached(obj)
+        obj = session.merge(obj, load=False)
+        unloaded = [k for k in self.exclude if k in sa_inspect(obj).unloaded]
+        if unloaded:
+            session.expire(obj, unloaded)
+        return obj
+
+    def get_values(self, key, session):
+        """Cached column values of one row as a dict shared between callers, do not modify it."""
+        key = str(key)
+        values = self.l1.get(key)
+        if values is not None:
+            metrics.incr(f'{self.name}_cache.l1_hit')
+            return values
+        return self.flight.do(key, lambda: self._load(key, session))
+
+    def invalidate(self, keys):
+        keys = [str(key) for key in keys]
+        with self._lock:
+            # loads started before this point must not refill the worker cache
+            self._generation += 1
+        for key in keys:
+            self.l1.pop(key)
+        client = get_redis()
+        if client is None or not keys:
+            return
+        try:
+            pipeline = client.pipeline(transaction=False)
+            for key in keys:
+                pipeline.set(self._redis_key(key), TOMBSTONE, px=TOMBSTONE_MS)
+            pipeline.execute()
+        except RedisError:
+            metrics.incr(f'{self.name}_cache.redis_error')
+
+    def key_of(self, obj):
+        return getattr(obj, self.pk_key)
+
+    def _load(self, key, session):
+        generation = self._generation
+        values = self._get_l2(key)
+        if values is not None:
+            metrics.incr(f'{self.name}_cache.l2_hit')
+        else:
+            metrics.incr(f'{self.name}_cache.miss')
+            with metrics.timed(f'{self.name}_cache.load'):
+                row = self._find_values(session, key=key).first()
+            if row is None:
+                return None
+            values = dict(zip(self.keys, row))
+            self._set_l2(key, values)
+        if generation == self._generation:
+            self.l1.set(key, values)
+        return values
+
+    def _redis_key(self, key):
+        return f'cache:{self.name}:{key}'
+
+    def _get_l2(self, key):
+        client = get_redis()
+        if client is None:
+            return None
+        try:
+            raw = client.get(self._redis_key(key))
+        except RedisError:
+            metrics.incr(f'{self.name}_cache.redis_error')
+            return None
+        if raw is None or raw == TOMBSTONE:
+            return None
+        values = json.loads(raw)
+        for k, decode in self.decoders.items():
+            if values.get(k) is not None:
+                values[k] = decode(values[k])
+        return values
+
+    def _set_l2(self, key, values):
+        client = get_redis()
+        if client is None:
+            return
+        raw = json.dumps({k: _encode(v) for k, v in values.items()})
+        try:
+            # nx leaves a tombstone in place, the row read here may predate the write that set it
+            client.set(self._redis_key(key), raw, ex=self.l2_ttl, nx=True)
+        except RedisError:
+            metrics.incr(f'{self.name}_cache.redis_error')
+
+
+def _encode(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def cache_model(model, l1_size, l1_ttl, l2_ttl, exclude=()):
+    """Attaches a ModelCache as ``model.__cache__`` and invalidates it on every ORM update or delete."""
+    cache = model.__cache__ = ModelCache(model, l1_size, l1_ttl, l2_ttl, exclude)
+
+    def on_row_written(mapper, connection, target):
+        invalidate_on_commit(object_session(target), cache, [cache.key_of(target)])
+
+    for event_name in ('after_update', 'after_delete'):
+        event.listen(model, event_name, on_row_written)
+    return cache
+
+
+def invalidate_on_commit(session, cache, keys):
+    if session is not None:
+        session.info.setdefault(SESSION_KEY, set()).update((cache, str(key)) for key in keys)
+
+
+@event.listens_for(Session, 'after_commit')
+def _on_commit(session):
+    invalidated = defaultdict(list)
+    for cache, key in session.info.pop(SESSION_KEY, ()):
+        invalidated[cache].append(key)
+    for cache, keys in invalidated.items():
+        cache.invalidate(keys)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _on_rollback(session, previous_transaction):
+    session.info.pop(SESSION_KEY, None)
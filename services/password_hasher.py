@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from config import PASSWORD_HASH_N, PASSWORD_HASH_R, PASSWORD_HASH_P, PASSWORD_HASH_WORKERS, \
+    PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_TIMEOUT, PASSWORD_HASH_BATCH_TIMEOUT
+from utils import metrics
+from utils.exceptions import ServiceUnavailable
+from utils.hash_util import hash_password, check_password, needs_rehash, is_legacy_hash
+
+
+class PasswordHasher(object):
+    """
+    Runs the password KDF in a process pool so request threads neither burn
+    CPU under the GIL nor queue without bound: once ``max_pending`` jobs are
+    waiting, new ones fail fast with ServiceUnavailable (HTTP 503).
+    """
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING,
+                 timeout=PASSWORD_HASH_TIMEOUT, n=PASSWORD_HASH_N, r=PASSWORD_HASH_R, p=PASSWORD_HASH_P):
+        self.workers = workers
+        self.timeout = timeout
+        self.n, self.r, self.p = n, r, p
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self):
+        # gunicorn forks workers after import, every worker needs its own pool
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            metrics.incr('password_hash.rejected')
+            raise ServiceUnavailable('Too many password operations in progress, please retry')
+        try:
+            executor = self._get_executor()
+            try:
+                future = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                self._discard_executor(executor)
+                executor = self._get_executor()
+                future = executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda done: self._on_done(done, executor))
+        return future
+
+    def _on_done(self, future, executor):
+        self._slots.release()
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._discard_executor(executor)
+
+    def _discard_executor(self, executor):
+        """Replaces a pool that lost a process, e.g. OOM killed, it refuses every later job."""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        metrics.incr('password_hash.pool_broken')
+        executor.shutdown(wait=False)
+
+    @staticmethod
+    def _result(future, timeout):
+        try:
+            return future.result(timeout=max(0, timeout))
+        except TimeoutError:
+            future.cancel()
+            metrics.incr('password_hash.timeout')
+            raise ServiceUnavailable('Password operation timed out, please retry')
+        except BrokenProcessPool:
+            raise ServiceUnavailable('Password operation failed, please retry')
+
+    def _run(self, fn, *args):
+        if self.workers == 0:
+            with metrics.timed('password_hash'):
+                return fn(*args)
+        future = self._submit(fn, *args)
+        with metrics.timed('password_hash'):
+            return self._result(future, self.timeout)
+
+    def hash(self, password):
+        return self._run(hash_password, password, self.n, self.r, self.p)
+
+    def hash_many(self, passwords, timeout=PASSWORD_HASH_BATCH_TIMEOUT):
+        """
+        Hashes a batch ``workers`` passwords at a time, each one holding a
+        pending slot, so single operations queue between rounds instead of
+        behind the whole batch. Raises ServiceUnavailable once the batch has
+        run for ``timeout`` seconds.
+        """
+        if self.workers == 0:
+            return [hash_password(password, self.n, self.r, self.p) for password in passwords]
+        deadline = time.monotonic() + timeout
+        hashes = []
+        with metrics.timed('password_hash.batch'):
+            for start in range(0, len(passwords), self.workers):
+                futures = [self._submit(hash_password, password, self.n, self.r, self.p)
+                           for password in passwords[start:start + self.workers]]
+                for future in futures:
+                    hashes.append(self._result(future, deadline - time.monotonic()))
+        return hashes
+
+    def verify(self, hashed_password, password):
+        if hashed_password and is_legacy_hash(hashed_password):
+            # single-pass sha512, not worth a round trip to the pool
+            return check_password(hashed_password, password)
+        return self._run(check_password, hashed_password, password)
+
+    def needs_rehash(self, hashed_password):
+        return needs_rehash(hashed_password, self.n, self.r, self.p)
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,41 @@
+import secrets
+from datetime import datetime, timedelta
+
+from config import FORGOT_PASSWORD_CODE_EXPIRY_TIME, PASSWORD_RESET_PURGE_BATCH_SIZE
+from model import PasswordResetCode, User
+from model.db import db
+
+
+def create_reset_code(user, session=None):
+    """Replaces any pending code of ``user`` and returns the new one, which is never stored in clear."""
+    session = session or db.session
+    code = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    PasswordResetCode.query.filter(PasswordResetCode.user_id == user.id).delete(synchronize_session=False)
+    session.add(PasswordResetCode(
+        code_hash=PasswordResetCode.hash_code(code),
+        user_id=user.id,
+        expires_at=now + timedelta(seconds=FORGOT_PASSWORD_CODE_EXPIRY_TIME),
+        created_at=now
+    ))
+    user.request_forgot_password_at = now
+    session.commit()
+    return code
+
+
+def find_user_by_reset_code(code):
+    """The user a still valid ``code`` was issued to, found with one probe of the code_hash index."""
+    return User.query.join(PasswordResetCode, PasswordResetCode.user_id == User.id) \
+        .filter(PasswordResetCode.code_hash == PasswordResetCode.hash_code(code),
+                PasswordResetCode.expires_at > datetime.utcnow()) \
+        .first()
+
+
+def consume_reset_codes(user):
+    """Invalidates every pending code of ``user``, committed together with the caller's session."""
+    PasswordResetCode.query.filter(PasswordResetCode.user_id == user.id).delete(synchronize_session=False)
+    user.request_forgot_password_at = None
+
+
+def purge_expired_reset_codes(batch_size=PASSWORD_RESET_PURGE_BATCH_SIZE):
+    return PasswordResetCode.purge_expired(batch_size)
@@ -0,0 +1,19 @@
+import redis
+
+from config import REDIS_URL
+
+_client = None
+
+
+def get_redis():
+    """
+    Shared Redis connection, or None when REDIS_URL is not configured.
+    Callers must fall back to the database when this returns None or when a
+    command raises ``redis.RedisError``.
+    """
+    global _client
+    if REDIS_URL is None:
+        return None
+    if _client is None:
+        _client = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+    return _client
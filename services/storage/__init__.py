@@ -0,0 +1,41 @@
+"""File storage
+
+``storage`` is the backend named by STORAGE_BACKEND, built on first use so
+importing the application needs neither boto3 nor S3 credentials:
+
+- ``s3``, a bucket, see services.storage.s3
+- ``local``, a folder under UPLOAD_FOLDER, see services.storage.local
+"""
+import threading
+
+from werkzeug.local import LocalProxy
+
+from config import STORAGE_BACKEND
+from services.storage.base import Storage, HEAD_FIELDS
+
+BACKENDS = ('s3', 'local')
+
+_storage = None
+_lock = threading.Lock()
+
+
+def make_storage(backend=STORAGE_BACKEND, **options):
+    if backend == 's3':
+        from services.storage.s3 import make_s3_storage
+        return make_s3_storage(**options)
+    if backend == 'local':
+        from services.storage.local import LocalStorage
+        return LocalStorage(**options)
+    raise ValueError(f'STORAGE_BACKEND must be one of {", ".join(BACKENDS)}, got {backend!r}')
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        with _lock:
+            if _storage is None:
+                _storage = make_storage()
+    return _storage
+
+
+storage = LocalProxy(get_storage)
@@ -0,0 +1,128 @@
+from abc import ABC, abstractmethod
+
+from flask import current_app
+
+from config import STORAGE_HEAD_CACHE_SIZE, STORAGE_HEAD_CACHE_TTL, STORAGE_HEAD_NEGATIVE_TTL, \
+    DOWNLOAD_CACHE_MAX_AGE
+from utils import metrics
+from utils.cache import TTLCache, MISSING
+from utils.exceptions import ApplicationError, BadRequest
+from utils.responser import make_json_response
+
+HEAD_FIELDS = ('ContentLength', 'ContentType', 'ETag', 'LastModified')
+
+
+class Storage(ABC):
+    """
+    What the application needs from a file store. Backends implement
+    ``_head``, ``_upload``, ``_delete``, ``send_object`` and
+    ``generate_urls_read``, existence checks are cached here for all of them.
+    """
+    name = None
+    errors = ()  # what a backend raises when the store itself fails
+
+    def __init__(self):
+        # head_object results by key, None for keys known to be missing
+        self.heads = TTLCache(maxsize=STORAGE_HEAD_CACHE_SIZE, ttl=STORAGE_HEAD_CACHE_TTL)
+
+    def head_object(self, key: str):
+        """
+        ContentLength, ContentType, ETag and LastModified of ``key``, or None
+        when it does not exist. Answers are cached, uploads and deletes made
+        through this worker invalidate them, others are seen after the TTL.
+        """
+        head = self.heads.get(key, MISSING)
+        if head is not MISSING:
+            metrics.incr('storage.head_cache_hit')
+            return head
+        metrics.incr('storage.head_cache_miss')
+        head = self._head(key)
+        if head is None:
+            self.heads.set(key, None, ttl=STORAGE_HEAD_NEGATIVE_TTL)
+        else:
+            self.heads.set(key, head)
+        return head
+
+    def check_if_object_exists(self, key: str):
+        return self.head_object(key) is not None
+
+    def validate_filename_exist(self, filename):
+        if not self.check_if_object_exists(filename):
+            raise BadRequest('filename not exist')
+        return filename
+
+    def get_size_object(self, key):
+        try:
+            head = self.head_object(key)
+        except self.errors as e:
+            current_app.logger.debug(e)
+            return None
+        return head['ContentLength'] if head is not None else None
+
+    def upload_file_obj(self, data, key, content_type='image/jpg'):
+        if key[0] == '/':
+            key = key[1:]
+        try:
+            return self._upload(data, key, content_type)
+        finally:
+            self.heads.pop(key)
+
+    def delete_object(self, key: str):
+        self._delete([key])
+        self.heads.pop(key)
+
+    def delete_objects(self, keys):
+        """Deletes up to 1000 keys at once, missing keys are ignored."""
+        if not keys:
+            return
+        self._delete(keys)
+        for key in keys:
+            self.heads.pop(key)
+
+    def generate_url_read(self, key):
+        if not isinstance(key, str):
+            raise ApplicationError('Key must be a string')
+        return self.generate_urls_read([key])[key]
+
+    @abstractmethod
+    def generate_urls_read(self, keys):
+        pass
+
+    def generate_url_upload(self, key, mime_type, content_length=None, expires_in=600):
+        raise ApplicationError(f'Direct uploads are not supported by the {self.name} storage backend')
+
+    def generate_post_upload(self, key, mime_type, max_size, expires_in=600):
+        raise ApplicationError(f'Direct uploads are not supported by the {self.name} storage backend')
+
+    @abstractmethod
+    def send_object(self, key):
+        """Response serving ``key`` to the current request, honouring its Range and If-None-Match headers."""
+
+    @abstractmethod
+    def _head(self, key):
+        pass
+
+    @abstractmethod
+    def _upload(self, data, key, content_type):
+        pass
+
+    @abstractmethod
+    def _delete(self, keys):
+        pass
+
+
+def set_download_headers(response, etag):
+    response.headers['Accept-Ranges'] = 'bytes'
+    if etag:
+        response.set_etag(etag.strip('"'))
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.max_age = DOWNLOAD_CACHE_MAX_AGE
+    return response
+
+
+def range_not_satisfiable(size):
+    """416 answer naming the object size in Content-Range, as RFC 7233 asks."""
+    response = make_json_response({'success': False, 'message': 'Requested range not satisfiable'}, code=416)
+    response.headers['Content-Range'] = f'bytes */{size}'
+    return response
@@ -0,0 +1,102 @@
+import mimetypes
+import os
+import shutil
+import tempfile
+from contextlib import suppress
+from datetime import datetime, timezone
+
+from flask import request, send_file, url_for
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+
+from config import LOCAL_STORAGE_ROOT, STORAGE_FOLDER, DOWNLOAD_CHUNK_SIZE
+from services.storage.base import Storage, set_download_headers, range_not_satisfiable
+from utils.exceptions import BadRequest
+
+
+class LocalStorage(Storage):
+    """
+    Files in a folder of this host, for development and on-prem installs.
+
+    Writes go to a temporary file next to the target which is fsynced and
+    renamed over it, so readers see the old or the new file, never a partial
+    one. Downloads hand the open file to the WSGI server's file wrapper,
+    which gunicorn sends with sendfile without copying it through Python.
+    """
+    name = 'local'
+    errors = (OSError,)
+
+    def __init__(self, root=LOCAL_STORAGE_ROOT):
+        super().__init__()
+        self.root = os.path.realpath(os.path.join(root, STORAGE_FOLDER or ''))
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        path = os.path.realpath(os.path.join(self.root, key))
+        if path == self.root or os.path.commonpath([self.root, path]) != self.root:
+            raise BadRequest('filename not valid')
+        return path
+
+    def generate_urls_read(self, keys):
+        """Urls of ``keys`` on the download route of the upload blueprint, they do not expire."""
+        return {key: url_for('upload.get_file_from_s3', filename=key) for key in keys}
+
+    def send_object(self, key):
+        try:
+            file = open(self.path(key), 'rb')
+        except FileNotFoundError:
+            raise BadRequest('File not found')
+        # stat the open file, a concurrent upload renames a new file over the path but this one stays intact
+        stat = os.fstat(file.fileno())
+        response = send_file(file, mimetype=content_type_of(key), add_etags=False, last_modified=stat.st_mtime)
+        response.content_length = stat.st_size
+        set_download_headers(response, etag_of(stat))
+        try:
+            # answers If-None-Match and single Range requests, only a full file goes out with sendfile
+            response.make_conditional(request, accept_ranges=True, complete_length=stat.st_size)
+        except RequestedRangeNotSatisfiable:
+            response.close()
+            return range_not_satisfiable(stat.st_size)
+        return response
+
+    def _head(self, key):
+        try:
+            stat = os.stat(self.path(key))
+        except FileNotFoundError:
+            return None
+        return {
+            'ContentLength': stat.st_size,
+            'ContentType': content_type_of(key),
+            'ETag': etag_of(stat),
+            'LastModified': datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+        }
+
+    def _upload(self, data, key, content_type):
+        path = self.path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                shutil.copyfileobj(data, temp, DOWNLOAD_CHUNK_SIZE)
+                temp.flush()
+                os.fsync(temp.fileno())
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.remove(temp_path)
+            raise
+
+    def _delete(self, keys):
+        for key in keys:
+            with suppress(FileNotFoundError):
+                os.remove(self.path(key))
+
+
+def content_type_of(key):
+    return mimetypes.guess_type(key)[0] or 'application/octet-stream'
+
+
+def etag_of(stat):
+    """ETag of a stored file, the same for head_object and downloads."""
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
@@ -0,0 +1,278 @@
+import os
+import time
+
+import boto3
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from flask import current_app, request, Response
+from redis import RedisError
+
+from config import STORAGE_FOLDER, S3_BUCKET_NAME, S3_MULTIPART_THRESHOLD, S3_MULTIPART_CHUNKSIZE, \
+    S3_MAX_CONCURRENCY, S3_MAX_INFLIGHT_BYTES, STORAGE_URL_READ_EXPIRY, STORAGE_URL_READ_REUSE_FRACTION, \
+    STORAGE_URL_READ_CACHE_SIZE, DOWNLOAD_CHUNK_SIZE
+from services.redis_client import get_redis
+from services.storage.base import Storage, HEAD_FIELDS, set_download_headers, range_not_satisfiable
+from utils import metrics
+from utils.cache import TTLCache
+from utils.exceptions import ApplicationError, BadRequest
+from utils.file_upload import iter_stream
+
+
+class S3Storage(Storage):
+    name = 's3'
+    errors = (ClientError,)
+    client = None
+    resource = None
+
+    def __init__(self, client, resource, transfer_config=None):
+        super().__init__()
+        self.client = client
+        self.resource = resource
+        self.transfer_config = transfer_config or make_transfer_config()
+        # presigned read urls by (key, window), see generate_urls_read
+        self.read_urls = TTLCache(maxsize=STORAGE_URL_READ_CACHE_SIZE)
+        self.url_window = max(1, int(STORAGE_URL_READ_EXPIRY * STORAGE_URL_READ_REUSE_FRACTION))
+
+    def get_bucket(self):
+        return self.resource.Bucket(S3_BUCKET_NAME)
+
+    def generate_url_upload(self, key, mime_type, content_length=None, expires_in=600):
+        """
+        Presigned PUT of ``key``. The client must send the signed Content-Type,
+        x-amz-acl: private and, when ``content_length`` is given, exactly
+        that many bytes.
+        """
+        if not isinstance(key, str):
+            raise ApplicationError('Key must be a string')
+        if not isinstance(mime_type, str):
+            raise ApplicationError('Mime type must be a string')
+        params = {
+            'Bucket': S3_BUCKET_NAME,
+            'Key': self.custom_key(key),
+            'ContentType': mime_type,
+            'ACL': 'private'
+        }
+        if content_length is not None:
+            params['ContentLength'] = content_length
+        return self.client.generate_presigned_url('put_object', Params=params, ExpiresIn=expires_in)
+
+    def generate_post_upload(self, key, mime_type, max_size, expires_in=600):
+        """
+        Presigned POST policy of ``key``: returns the ``url`` and the form
+        ``fields`` to send before the file. S3 itself rejects another
+        Content-Type or a body larger than ``max_size``.
+        """
+        if not isinstance(key, str):
+            raise ApplicationError('Key must be a string')
+        return self.client.generate_presigned_post(
+            Bucket=S3_BUCKET_NAME,
+            Key=self.custom_key(key),
+            Fields={'Content-Type': mime_type, 'acl': 'private'},
+            Conditions=[
+                {'Content-Type': mime_type},
+                {'acl': 'private'},
+                ['content-length-range', 1, max_size]
+            ],
+            ExpiresIn=expires_in
+        )
+
+    def generate_urls_read(self, keys):
+        """
+        Presigned GET urls of ``keys`` as a dict. Time is cut into windows of
+        STORAGE_URL_READ_REUSE_FRACTION of the url lifetime and every key gets
+        one url per window, shared by all workers through Redis, so browsers
+        can cache what it points to. A url handed out is always valid for at
+        least the rest of its lifetime past that fraction.
+        """
+        now = time.time()
+        window = int(now // self.url_window)
+        window_ttl = max(1, int((window + 1) * self.url_window - now))
+        urls = {}
+        missing = []
+        for key in keys:
+            url = self.read_urls.get((key, window))
+            if url is None:
+                missing.append(key)
+            else:
+                urls[key] = url
+        metrics.incr('storage.url_read_cache_hit', len(keys) - len(missing))
+        if not missing:
+            return urls
+        shared = self._get_shared_urls_read(missing, window)
+        signed = {}
+        for key in missing:
+            if key in shared:
+                continue
+            signed[key] = self.client.generate_presigned_url(
+                'get_object',
+                Params={
+                    'Bucket': S3_BUCKET_NAME,
+                    'Key': self.custom_key(key),
+                },
+                ExpiresIn=STORAGE_URL_READ_EXPIRY
+            )
+        metrics.incr('storage.url_read_signed', len(signed))
+        shared.update(self._share_urls_read(signed, window, window_ttl))
+        for key, url in shared.items():
+            self.read_urls.set((key, window), url, ttl=window_ttl)
+        urls.update(shared)
+        return urls
+
+    @staticmethod
+    def _get_shared_urls_read(keys, window):
+        client = get_redis()
+        if client is None:
+            return {}
+        try:
+            stored = client.mget([f'storage_url_read:{window}:{key}' for key in keys])
+        except RedisError:
+            metrics.incr('storage.redis_error')
+            return {}
+        return {key: url.decode() for key, url in zip(keys, stored) if url is not None}
+
+    @staticmethod
+    def _share_urls_read(signed, window, window_ttl):
+        """Publishes ``signed`` for the window, keeping the urls another worker published first."""
+        client = get_redis()
+        if client is None or not signed:
+            return signed
+        try:
+            pipeline = client.pipeline(transaction=False)
+            for key, url in signed.items():
+                redis_key = f'storage_url_read:{window}:{key}'
+                pipeline.set(redis_key, url, ex=window_ttl, nx=True)
+                pipeline.get(redis_key)
+            results = pipeline.execute()
+        except RedisError:
+            metrics.incr('storage.redis_error')
+            return signed
+        shared = {}
+        for key, stored in zip(signed, results[1::2]):
+            shared[key] = stored.decode() if stored is not None else signed[key]
+        return shared
+
+    def get_object(self, key):
+        if not isinstance(key, str):
+            raise ApplicationError('Key must be a string')
+        key = self.custom_key(key)
+        return self.resource.Object(S3_BUCKET_NAME, key)
+
+    def open_object(self, key, byte_range=None, if_none_match=None):
+        """
+        GetObject response of ``key``. Its ``Body`` is read lazily so it can be
+        streamed. ``byte_range`` is a single range HTTP Range value handed to
+        S3, which then answers with ``ContentRange``.
+        """
+        if not isinstance(key, str):
+            raise ApplicationError('Key must be a string')
+        params = {'Bucket': S3_BUCKET_NAME, 'Key': self.custom_key(key)}
+        if byte_range is not None:
+            params['Range'] = byte_range
+        if if_none_match is not None:
+            params['IfNoneMatch'] = if_none_match
+        return self.client.get_object(**params)
+
+    def send_object(self, key):
+        # multi range requests are answered with the whole file, which RFC 7233 allows
+        byte_range = request.range.to_header() if request.range and len(request.range.ranges) == 1 else None
+        try:
+            file = self.open_object(key, byte_range=byte_range,
+                                    if_none_match=request.headers.get('If-None-Match'))
+        except ClientError as e:
+            error_code = e.response['Error']['Code']
+            if error_code in ('NoSuchKey', '404'):
+                raise BadRequest('File not found')
+            if error_code == 'InvalidRange':
+                size = e.response['Error'].get('ActualObjectSize')
+                if size is None:
+                    head = self.head_object(key)
+                    if head is None:
+                        raise BadRequest('File not found')
+                    size = head['ContentLength']
+                return range_not_satisfiable(size)
+            if error_code in ('NotModified', '304'):
+                response = Response(status=304)
+                return set_download_headers(response, e.response['ResponseMetadata']['HTTPHeaders'].get('etag'))
+            raise ApplicationError(str(e))
+        # the body is pulled from S3 chunk by chunk as the client reads, a download never sits in memory
+        response = Response(iter_stream(file['Body'], DOWNLOAD_CHUNK_SIZE),
+                            status=206 if 'ContentRange' in file else 200,
+                            content_type=file.get('ContentType', 'application/octet-stream'),
+                            direct_passthrough=True)
+        response.headers['Content-Length'] = str(file['ContentLength'])
+        if 'ContentRange' in file:
+            response.headers['Content-Range'] = file['ContentRange']
+        response.last_modified = file.get('LastModified')
+        return set_download_headers(response, file.get('ETag'))
+
+    def _head(self, key):
+        try:
+            response = self.client.head_object(Bucket=S3_BUCKET_NAME, Key=self.custom_key(key))
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+                raise
+            return None
+        return {field: response.get(field) for field in HEAD_FIELDS}
+
+    def _upload(self, data, key, content_type):
+        """
+        Uploads ``data`` with the storage transfer config. A non seekable
+        stream, such as a request body, is read one part at a time and never
+        held in full, see make_transfer_config.
+        """
+        try:
+            return self.client.upload_fileobj(
+                data, S3_BUCKET_NAME, self.custom_key(key),
+                ExtraArgs={
+                    'ContentType': content_type
+                },
+                Config=self.transfer_config
+            )
+        except S3UploadFailedError as e:
+            current_app.logger.debug(e)
+            raise ApplicationError('Can not upload to server')
+
+    def _delete(self, keys):
+        if len(keys) == 1:
+            self.get_object(keys[0]).delete()
+            return
+        self.client.delete_objects(
+            Bucket=S3_BUCKET_NAME,
+            Delete={'Objects': [{'Key': self.custom_key(key)} for key in keys], 'Quiet': True}
+        )
+
+    @staticmethod
+    def custom_key(key: str) -> str:
+        return f'{STORAGE_FOLDER}/{key}'
+
+
+def make_transfer_config(multipart_threshold=S3_MULTIPART_THRESHOLD, multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+                         max_concurrency=S3_MAX_CONCURRENCY, max_inflight_bytes=S3_MAX_INFLIGHT_BYTES):
+    config = TransferConfig(
+        multipart_threshold=multipart_threshold,
+        multipart_chunksize=multipart_chunksize,
+        max_concurrency=max_concurrency,
+        use_threads=max_concurrency > 1
+    )
+    # parts read ahead from a non seekable stream wait in memory, this caps them to max_inflight_bytes
+    config.max_in_memory_upload_chunks = max(1, max_inflight_bytes // multipart_chunksize)
+    return config
+
+
+def make_s3_storage(client=None, resource=None):
+    if client is None:
+        client = boto3.client(
+            's3',
+            aws_access_key_id=os.getenv('S3_ACCESS_KEY'),
+            aws_secret_access_key=os.getenv('S3_SECRET_KEY'),
+            region_name=os.getenv('S3_REGION')
+        )
+    if resource is None:
+        resource = boto3.resource(
+            's3',
+            aws_access_key_id=os.getenv('S3_ACCESS_KEY'),
+            aws_secret_access_key=os.getenv('S3_SECRET_KEY'),
+            region_name=os.getenv('S3_REGION')
+        )
+    return S3Storage(client, resource)
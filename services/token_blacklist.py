@@ -0,0 +1,201 @@
+import threading
+import time
+from datetime import datetime
+
+from redis import RedisError
+
+from config import REVOKED_TOKEN_SYNC_INTERVAL, REVOKED_TOKEN_FILTER_CAPACITY, \
+    REVOKED_TOKEN_FILTER_ERROR_RATE, REVOKED_TOKEN_LRU_SIZE, REVOKED_TOKEN_PURGE_BATCH_SIZE, \
+    JWT_REFRESH_TOKEN_EXPIRES
+from model import RevokedToken
+from model.db import db
+from services.redis_client import get_redis
+from utils import metrics
+from utils.bloom_filter import BloomFilter
+from utils.cache import TTLCache
+from utils.exceptions import ServiceUnavailable
+
+REDIS_KEY = 'revoked_tokens'
+SEEDED_KEY = 'revoked_tokens:seeded'  # the sorted set holds every revocation of the table
+SEEDING_KEY = 'revoked_tokens:seeding'
+SEED_LOCK_TTL = 300  # seconds
+SYNC_OVERLAP = 2  # seconds re-read on every sync to absorb clock skew between hosts
+SEED_BATCH_SIZE = 10000
+REDIS_WRITE_ATTEMPTS = 2
+
+
+class RevokedTokenCache(object):
+    """
+    Layered revoked-token lookup kept by every worker:
+
+    1. a bloom filter of all revoked jtis answers "not revoked" without I/O,
+    2. an LRU of confirmed jtis answers "revoked" without I/O,
+    3. a Redis sorted set (jti scored by revocation time) is the shared source
+       of truth, and the ``revoked_tokens`` table is the fallback.
+
+    The filter pulls new revocations at most every ``sync_interval`` seconds,
+    which bounds how long a logout on another worker can go unnoticed.
+    """
+
+    def __init__(self, sync_interval=REVOKED_TOKEN_SYNC_INTERVAL, capacity=REVOKED_TOKEN_FILTER_CAPACITY,
+                 error_rate=REVOKED_TOKEN_FILTER_ERROR_RATE, lru_size=REVOKED_TOKEN_LRU_SIZE):
+        self.sync_interval = sync_interval
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.confirmed = TTLCache(maxsize=lru_size)
+        self.bloom = None
+        self.synced_at = 0
+        self.last_id = 0
+        self._lock = threading.Lock()
+
+    def revoke(self, jti, expires_at):
+        client = get_redis()
+        if client is not None:
+            # other workers only learn of the revocation from the sorted set, a logout missing it must fail
+            self._publish(client, jti)
+        RevokedToken(jti=jti, expires_at=expires_at).add()
+        bloom = self.bloom
+        if bloom is not None:
+            bloom.add(jti)
+        self.confirmed.set(jti, True)
+
+    @staticmethod
+    def _publish(client, jti):
+        for _ in range(REDIS_WRITE_ATTEMPTS):
+            try:
+                client.zadd(REDIS_KEY, {jti: time.time()})
+                return
+            except RedisError:
+                metrics.incr('revoked_token.redis_error')
+        raise ServiceUnavailable('Can not revoke the token, please retry')
+
+    def is_revoked(self, jti):
+        bloom = self._sync()
+        if bloom is None:
+            metrics.incr('revoked_token.db_lookup')
+            return RevokedToken.is_jti_blacklisted(jti)
+        if jti not in bloom:
+            metrics.incr('revoked_token.filter_negative')
+            return False
+        if self.confirmed.get(jti):
+            metrics.incr('revoked_token.lru_hit')
+            return True
+        revoked = self._lookup(jti)
+        if revoked:
+            self.confirmed.set(jti, True)
+        return revoked
+
+    def _lookup(self, jti):
+        client = get_redis()
+        if client is not None:
+            try:
+                revoked = client.zscore(REDIS_KEY, jti) is not None
+                metrics.incr('revoked_token.redis_lookup')
+                if revoked:
+                    return True
+            except RedisError:
+                metrics.incr('revoked_token.redis_error')
+                client = None
+        # a filter hit missing from Redis is a false positive, or a revocation a flushed Redis lost
+        metrics.incr('revoked_token.db_lookup')
+        revoked = RevokedToken.is_jti_blacklisted(jti)
+        if revoked and client is not None:
+            try:
+                client.zadd(REDIS_KEY, {jti: time.time()}, nx=True)
+            except RedisError:
+                metrics.incr('revoked_token.redis_error')
+        return revoked
+
+    def _sync(self):
+        """Returns the filter, or None when it can not be trusted and the caller must ask the database."""
+        now = time.time()
+        bloom = self.bloom
+        if bloom is not None and now - self.synced_at < self.sync_interval:
+            return bloom
+        if not self._lock.acquire(blocking=False):
+            # another thread is syncing, the current filter is still within the staleness bound
+            return bloom
+        try:
+            if self.bloom is None or self.bloom.is_full():
+                self._rebuild()
+            else:
+                self._pull()
+            self.synced_at = now
+            metrics.incr('revoked_token.sync')
+            return self.bloom
+        except RedisError:
+            metrics.incr('revoked_token.redis_error')
+            self.bloom = None
+            return None
+        finally:
+            self._lock.release()
+
+    def _rebuild(self):
+        client = get_redis()
+        if client is not None and not client.exists(SEEDED_KEY):
+            # Redis is new or was flushed, one worker copies the table into it while the others read the table
+            if client.set(SEEDING_KEY, 1, ex=SEED_LOCK_TTL, nx=True):
+                self._seed_redis(client)
+                client.set(SEEDED_KEY, 1)
+                client.delete(SEEDING_KEY)
+            else:
+                client = None
+        if client is not None:
+            jtis = [jti.decode() for jti in client.zrange(REDIS_KEY, 0, -1)]
+        else:
+            rows = db.session.query(RevokedToken.id, RevokedToken.jti).order_by(RevokedToken.id).all()
+            jtis = [jti for _, jti in rows]
+            self.last_id = rows[-1][0] if rows else 0
+        bloom = BloomFilter(max(self.capacity, 2 * len(jtis)), self.error_rate)
+        for jti in jtis:
+            bloom.add(jti)
+        self.bloom = bloom
+
+    def _pull(self):
+        client = get_redis()
+        if client is not None:
+            jtis = [jti.decode() for jti in client.zrangebyscore(REDIS_KEY, self.synced_at - SYNC_OVERLAP, '+inf')]
+        else:
+            rows = db.session.query(RevokedToken.id, RevokedToken.jti) \
+                .filter(RevokedToken.id > self.last_id) \
+                .order_by(RevokedToken.id).all()
+            jtis = [jti for _, jti in rows]
+            if rows:
+                self.last_id = rows[-1][0]
+        for jti in jtis:
+            self.bloom.add(jti)
+
+    @staticmethod
+    def _seed_redis(client):
+        now = time.time()
+        query = db.session.query(RevokedToken.jti).yield_per(SEED_BATCH_SIZE)
+        batch = {}
+        for (jti,) in query:
+            batch[jti] = now
+            if len(batch) >= SEED_BATCH_SIZE:
+                client.zadd(REDIS_KEY, batch, nx=True)
+                batch = {}
+        if batch:
+            client.zadd(REDIS_KEY, batch, nx=True)
+
+
+revoked_tokens = RevokedTokenCache()
+
+
+def revoke_token(decoded_token):
+    expires_at = datetime.utcfromtimestamp(decoded_token['exp'])
+    revoked_tokens.revoke(decoded_token['jti'], expires_at)
+
+
+def is_token_revoked(jti):
+    return revoked_tokens.is_revoked(jti)
+
+
+def purge_expired_revoked_tokens(batch_size=REVOKED_TOKEN_PURGE_BATCH_SIZE):
+    deleted = RevokedToken.purge_expired(batch_size)
+    client = get_redis()
+    if client is not None:
+        # Redis scores are revocation times, nothing revoked before this can still be alive
+        oldest_alive = time.time() - JWT_REFRESH_TOKEN_EXPIRES.total_seconds()
+        client.zremrangebyscore(REDIS_KEY, '-inf', oldest_alive)
+    return deleted
@@ -0,0 +1,81 @@
+import time
+
+from redis import RedisError
+
+from config import USER_TOKEN_EPOCH_CACHE_SIZE, USER_TOKEN_EPOCH_CACHE_TTL
+from model import User
+from model.db import db
+from services.redis_client import get_redis
+from utils import metrics
+from utils.cache import TTLCache
+
+REDIS_KEY = 'user_token_epoch'
+
+_epochs = TTLCache(maxsize=USER_TOKEN_EPOCH_CACHE_SIZE, ttl=USER_TOKEN_EPOCH_CACHE_TTL)
+
+
+def get_token_epoch(user_id):
+    """
+    Current token epoch of a user: a unix timestamp, every token issued up to
+    that second is revoked. Read from the worker cache, then Redis, then the user table.
+    """
+    user_id = str(user_id)
+    epoch = _epochs.get(user_id)
+    if epoch is not None:
+        metrics.incr('token_epoch.cache_hit')
+        return epoch
+    metrics.incr('token_epoch.cache_miss')
+    client = get_redis()
+    if client is not None:
+        try:
+            value = client.hget(REDIS_KEY, user_id)
+            if value is not None:
+                epoch = int(value)
+        except RedisError:
+            metrics.incr('token_epoch.redis_error')
+    if epoch is None:
+        epoch = db.session.query(User.token_epoch).filter(User.id == user_id).scalar() or 0
+        if client is not None:
+            try:
+                # hsetnx so a concurrent revoke_user_tokens is never overwritten with the old value
+                client.hsetnx(REDIS_KEY, user_id, epoch)
+            except RedisError:
+                metrics.incr('token_epoch.redis_error')
+    _epochs.set(user_id, epoch)
+    return epoch
+
+
+def publish_token_epoch(user_id, epoch):
+    publish_token_epochs([user_id], epoch)
+
+
+def publish_token_epochs(user_ids, epoch):
+    mapping = {str(user_id): epoch for user_id in user_ids}
+    if not mapping:
+        return
+    for user_id in mapping:
+        _epochs.set(user_id, epoch)
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        client.hmset(REDIS_KEY, mapping)
+    except RedisError:
+        metrics.incr('token_epoch.redis_error')
+
+
+def revoke_user_tokens(user, session=None):
+    """Revokes every access and refresh token issued to ``user`` so far with one row update."""
+    session = session or db.session
+    user.token_epoch = int(time.time())
+    session.commit()
+    publish_token_epoch(user.id, user.token_epoch)
+
+
+def is_token_outdated(decoded_token):
+    epoch = get_token_epoch(decoded_token['identity'])
+    if decoded_token['type'] == 'access':
+        return decoded_token['user_claims'].get('epoch', 0) < epoch
+    # refresh tokens carry no custom claims, fall back to their issue time, which shares the epoch resolution:
+    # one issued in the second of the revocation may predate it, so it is revoked too
+    return decoded_token['iat'] <= epoch
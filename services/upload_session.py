@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+
+from config import UploadSessionStatus, UploadMethod, UPLOAD_SESSION_EXPIRY, UPLOAD_SESSION_GC_GRACE, \
+    UPLOAD_SESSION_GC_BATCH_SIZE
+from model import UploadSession
+from model.db import db
+from services.storage import storage
+from utils.exceptions import BadRequest, PermissionDenied
+from utils.file_upload import get_filename
+
+
+def create_upload_session(user_id, filename, content_type, size, method=UploadMethod.POST.value):
+    """
+    Reserves a key and returns what the client needs to send the file straight
+    to the bucket: a POST policy limited to ``size`` bytes, or a PUT url
+    signed for exactly ``size`` bytes.
+    """
+    now = datetime.utcnow()
+    upload_session = UploadSession(
+        key=get_filename(filename),
+        user_id=user_id,
+        method=method,
+        content_type=content_type,
+        max_size=size,
+        expires_at=now + timedelta(seconds=UPLOAD_SESSION_EXPIRY),
+        created_at=now
+    )
+    upload_session.save(session=db.session)
+    if method == UploadMethod.PUT.value:
+        upload = {
+            'url': storage.generate_url_upload(upload_session.key, content_type, content_length=size,
+                                               expires_in=UPLOAD_SESSION_EXPIRY),
+            'headers': {'Content-Type': content_type, 'x-amz-acl': 'private'}
+        }
+    else:
+        upload = storage.generate_post_upload(upload_session.key, content_type, size,
+                                              expires_in=UPLOAD_SESSION_EXPIRY)
+    return {
+        'id': str(upload_session.id),
+        'filename': upload_session.key,
+        'method': method,
+        'expires_at': upload_session.expires_at.isoformat(),
+        'upload': upload
+    }
+
+
+def complete_upload_session(session_id, user_id):
+    """Checks the uploaded object with head_object and records it, a non conforming object is deleted."""
+    upload_session = UploadSession.query.filter(UploadSession.id == session_id).with_for_update().first()
+    if upload_session is None:
+        raise BadRequest('Upload session not found')
+    if str(upload_session.user_id) != str(user_id):
+        raise PermissionDenied('Upload session belongs to another user')
+    if upload_session.status == UploadSessionStatus.COMPLETED.value:
+        return upload_session
+    # a missing object may have been cached before the client uploaded it
+    storage.heads.pop(upload_session.key)
+    head = storage.head_object(upload_session.key)
+    if head is None:
+        raise BadRequest('File has not been uploaded')
+    if upload_session.method == UploadMethod.PUT.value:
+        valid_size = head['ContentLength'] == upload_session.max_size
+    else:
+        valid_size = head['ContentLength'] <= upload_session.max_size
+    if not valid_size or head['ContentType'] != upload_session.content_type:
+        storage.delete_object(upload_session.key)
+        db.session.delete(upload_session)
+        db.session.commit()
+        raise BadRequest('Uploaded file does not match the upload session')
+    upload_session.update({
+        'status': UploadSessionStatus.COMPLETED.value,
+        'size': head['ContentLength'],
+        'etag': (head['ETag'] or '').strip('"'),
+        'completed_at': datetime.utcnow()
+    }, session=db.session)
+    return upload_session
+
+
+def purge_abandoned_upload_sessions(batch_size=UPLOAD_SESSION_GC_BATCH_SIZE, now=None):
+    """
+    Deletes pending sessions expired for longer than the grace period together
+    with whatever their clients managed to upload, one DeleteObjects request
+    and one commit per batch. Returns the number of purged sessions.
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=UPLOAD_SESSION_GC_GRACE)
+    purged = 0
+    while True:
+        rows = db.session.query(UploadSession.id, UploadSession.key) \
+            .filter(UploadSession.status == UploadSessionStatus.PENDING.value,
+                    UploadSession.expires_at < cutoff) \
+            .limit(batch_size) \
+            .with_for_update(skip_locked=True) \
+            .all()
+        if not rows:
+            return purged
+        storage.delete_objects([key for _, key in rows])
+        UploadSession.query.filter(UploadSession.id.in_([session_id for session_id, _ in rows])) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+        purged += len(rows)
+        if len(rows) < batch_size:
+            return purged
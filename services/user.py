@@ -1,11 +1,33 @@
+import time
+import uuid
 from datetime import datetime
 from functools import reduce
 
-from sqlalchemy import func, distinct, or_, and_
+from sqlalchemy import func, distinct, or_, and_, bindparam
+from sqlalchemy.dialects.postgresql import insert
+from voluptuous import Invalid
 
 from model import User
-from utils.exceptions import BadRequest
-from config import UserStatus
+from model.db import db, PowerPaintQuery
+from services.collection_version import mark_collection_written
+from services.email_index import email_index
+from services.password_hasher import password_hasher
+from services.token_epoch import publish_token_epochs
+from utils.cache import TTLCache
+from utils.exceptions import BadRequest, UserInputInvalid
+from config import UserRole, UserStatus, USER_ROLE_CACHE_SIZE, USER_ROLE_CACHE_TTL, BULK_CREATE_CHUNK_SIZE
+
+_roles = TTLCache(maxsize=USER_ROLE_CACHE_SIZE, ttl=USER_ROLE_CACHE_TTL)
+
+_find_active_by_email = PowerPaintQuery.bake(
+    'user.find_active_by_email',
+    lambda session: session.query(User).filter(User.email == bindparam('email'),
+                                               User.status != UserStatus.BLOCKED.value)
+)
+_find_role_and_status = PowerPaintQuery.bake(
+    'user.find_role_and_status',
+    lambda session: session.query(User.role, User.status).filter(User.id == bindparam('user_id'))
+)
 
 
 def create_user(data):
@@ -19,19 +41,177 @@ def create_user(data):
 
 
 def find_user_by_email(email):
-    user = User.query.find_by_filter(model=User, filter={'email': email.lower()})
+    email = email.lower()
+    if email_index.is_unknown(email):
+        return None
+    user = User.query.filter(func.lower(User.email) == email).first()
+    if user is None:
+        email_index.remember_unknown(email)
     return user
 
 
+def email_exists(email):
+    """Like find_user_by_email but only probes the lower(email) index instead of loading the user."""
+    email = email.lower()
+    if email_index.is_unknown(email):
+        return False
+    exists = db.session.query(User.id).filter(func.lower(User.email) == email).first() is not None
+    if not exists:
+        email_index.remember_unknown(email)
+    return exists
+
+
+def find_active_user_by_email(email):
+    """The login lookup: exact match on the stored, lowercased email."""
+    return _find_active_by_email(email=email.lower()).first()
+
+
+def find_existing_emails(emails):
+    rows = db.session.query(func.lower(User.email)).filter(func.lower(User.email).in_(emails)).all()
+    return {email for email, in rows}
+
+
+def bulk_create_users(items, schema):
+    """
+    Creates many users with one email lookup, one parallel hashing batch and
+    one multi-row INSERT per chunk, each chunk committed on its own. Returns
+    one result per item, in order.
+    """
+    results = [None] * len(items)
+    pending = []
+    seen = set()
+    for index, item in enumerate(items):
+        try:
+            data = schema(item)
+        except (Invalid, BadRequest, UserInputInvalid) as e:
+            results[index] = {'index': index, 'success': False, 'message': str(e)}
+            continue
+        email = data['email'].lower()
+        if email in seen:
+            results[index] = {'index': index, 'success': False, 'message': 'email is duplicated in the request'}
+            continue
+        seen.add(email)
+        pending.append((index, email, data))
+
+    for start in range(0, len(pending), BULK_CREATE_CHUNK_SIZE):
+        chunk = []
+        candidates = pending[start:start + BULK_CREATE_CHUNK_SIZE]
+        existing = find_existing_emails([email for _, email, _ in candidates])
+        for index, email, data in candidates:
+            if email in existing:
+                results[index] = {'index': index, 'success': False, 'message': 'email already exists'}
+            else:
+                chunk.append((index, email, data))
+        if not chunk:
+            continue
+        hashes = password_hasher.hash_many([data['password'] for _, _, data in chunk])
+        now = datetime.utcnow()
+        rows = [{
+            'id': uuid.uuid4(),
+            'email': email,
+            'name': data['name'],
+            'role': UserRole.USER.value,
+            'status': UserStatus.ACTIVE.value,
+            'password_hash': password_hash,
+            'token_epoch': 0,
+            'created_at': now,
+            'updated_at': now
+        } for (_, email, data), password_hash in zip(chunk, hashes)]
+        statement = insert(User.__table__).values(rows) \
+            .on_conflict_do_nothing(index_elements=['email']) \
+            .returning(User.__table__.c.email)
+        try:
+            inserted = {email for email, in db.session.execute(statement)}
+            mark_collection_written(db.session, User.__tablename__)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        email_index.added(inserted)
+        for (index, email, _), row in zip(chunk, rows):
+            if email in inserted:
+                results[index] = {'index': index, 'success': True, 'id': str(row['id'])}
+            else:
+                results[index] = {'index': index, 'success': False, 'message': 'email already exists'}
+    return results
+
+
+def bulk_update_users(data):
+    """
+    Sets ``role`` and/or ``status`` of the users picked by ``ids`` or by a
+    ``filter`` on role and status with a single UPDATE. Blocking moves the
+    token epoch in the same statement, revoking every token of those users.
+    """
+    values = {k: data[k] for k in ('role', 'status') if k in data}
+    if not values:
+        raise BadRequest('role or status is required')
+    if ('ids' in data) == ('filter' in data):
+        raise BadRequest('exactly one of ids or filter is required')
+    table = User.__table__
+    if 'ids' in data:
+        criteria = [table.c.id.in_(data['ids'])]
+    else:
+        criteria = [table.c[k] == v for k, v in data['filter'].items()]
+    # rows already in the requested state are neither written nor reported
+    criteria.append(or_(*[table.c[k] != v for k, v in values.items()]))
+    server_values = {}
+    if values.get('status') == UserStatus.BLOCKED.value:
+        server_values['token_epoch'] = int(time.time())
+    rows = User.bulk_update(values, *criteria, session=db.session, server_values=server_values)
+    user_ids = [str(user_id) for user_id, in rows]
+    for user_id in user_ids:
+        forget_user_role_and_status(user_id)
+    if server_values:
+        publish_token_epochs(user_ids, server_values['token_epoch'])
+    rv = {'updated': len(user_ids), 'ids': user_ids}
+    if 'ids' in data:
+        rv['unchanged'] = len(set(data['ids'])) - len(user_ids)
+    return rv
+
+
 def get_blocked_user_or_404(user_id):
-    user = User.query.filter(User.id == str(user_id), User.status == UserStatus.BLOCKED.value).first()
-    if not bool(user):
+    user = User.__cache__.get(user_id, db.session)
+    if user is None or user.status != UserStatus.BLOCKED.value:
         raise BadRequest('User not found or is active')
     return user
 
 
 def get_user_profile_or_404(user_id):
-    user = User.query.filter(User.id == str(user_id), User.status != UserStatus.BLOCKED.value).first()
-    if not bool(user):
+    user = User.__cache__.get(user_id, db.session)
+    if user is None or user.status == UserStatus.BLOCKED.value:
         raise BadRequest('User not found or is blocked')
     return user
+
+
+def get_user_updated_at_or_404(user_id):
+    """The version of a profile, for conditional requests, read from the user cache without building a User."""
+    values = User.__cache__.get_values(user_id, db.session)
+    if values is None or values['status'] == UserStatus.BLOCKED.value:
+        raise BadRequest('User not found or is blocked')
+    return values['updated_at']
+
+
+def get_user_fields_or_404(user_id, fields):
+    """
+    Like get_user_profile_or_404 but selects only ``fields``. Returns them
+    serialized together with the updated_at of the row, read in the same query.
+    """
+    row = db.session.query(User.updated_at, *[getattr(User, field) for field in fields]) \
+        .filter(User.id == str(user_id), User.status != UserStatus.BLOCKED.value).first()
+    if row is None:
+        raise BadRequest('User not found or is blocked')
+    return User.rows_to_json([row], fields)[0], row.updated_at
+
+
+def get_user_role_and_status(user_id):
+    user_id = str(user_id)
+    rv = _roles.get(user_id)
+    if rv is None:
+        rv = _find_role_and_status(user_id=user_id).first() or (None, None)
+        rv = tuple(rv)
+        _roles.set(user_id, rv)
+    return rv
+
+
+def forget_user_role_and_status(user_id):
+    _roles.pop(str(user_id))
@@ -0,0 +1,8 @@
+from celery_app import celery
+from services.password_reset import purge_expired_reset_codes
+
+
+@celery.task(name='tasks.password_reset.purge_expired_reset_codes')
+def purge_expired_reset_codes_task():
+    deleted = purge_expired_reset_codes()
+    print(f'Purged {deleted} expired password reset codes.')
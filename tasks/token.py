@@ -0,0 +1,8 @@
+from celery_app import celery
+from services.token_blacklist import purge_expired_revoked_tokens
+
+
+@celery.task(name='tasks.token.purge_expired_revoked_tokens')
+def purge_expired_revoked_tokens_task():
+    deleted = purge_expired_revoked_tokens()
+    print(f'Purged {deleted} expired revoked tokens.')
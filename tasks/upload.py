@@ -0,0 +1,8 @@
+from celery_app import celery
+from services.upload_session import purge_abandoned_upload_sessions
+
+
+@celery.task(name='tasks.upload.purge_abandoned_upload_sessions')
+def purge_abandoned_upload_sessions_task():
+    purged = purge_abandoned_upload_sessions()
+    print(f'Purged {purged} abandoned upload sessions.')
@@ -0,0 +1,8 @@
+from celery_app import celery
+from services.user import bulk_create_users
+from validation.user import CREATE_USER_SCHEMA
+
+
+@celery.task(name='tasks.user.bulk_create_users')
+def bulk_create_users_task(items):
+    return bulk_create_users(items, CREATE_USER_SCHEMA)
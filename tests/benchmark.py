@@ -0,0 +1,24 @@
+import os
+import statistics
+import time
+
+SCALE = float(os.environ.get('BENCHMARK_SCALE', '1'))
+
+
+def scaled(count):
+    """``count`` rows multiplied by BENCHMARK_SCALE, at least one."""
+    return max(1, int(count * SCALE))
+
+
+def timed(function, repeat=200):
+    """Median seconds of one call of ``function`` over ``repeat`` calls."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def report(name, **values):
+    print(f'\n[benchmark] {name}: ' + ', '.join(f'{key}={value:.6g}' for key, value in values.items()))
@@ -0,0 +1,63 @@
+"""
+Benchmarks of the hot paths: revoked-token lookups, logins and user list
+pagination. They need a scratch PostgreSQL database named by
+BENCHMARK_DATABASE_URI, whose tables are created and dropped by the run,
+and are skipped without it. BENCHMARK_SCALE multiplies every row count.
+"""
+import os
+
+import pytest
+
+DATABASE_URI = os.environ.get('BENCHMARK_DATABASE_URI')
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'benchmark: timed against BENCHMARK_DATABASE_URI')
+
+
+@pytest.fixture(scope='session')
+def app():
+    if not DATABASE_URI:
+        pytest.skip('BENCHMARK_DATABASE_URI is not set')
+    # utils.model_session binds its engine at import time
+    os.environ['SQLALCHEMY_DATABASE_URI'] = DATABASE_URI
+    from flask import Flask
+    from flask_jwt_extended import JWTManager
+
+    from model import User
+    from model.db import db
+    from utils.exceptions import register_error_handlers
+    from utils.permission import make_access_claims
+
+    # main.create_app also seeds an admin and needs Sentry, Swagger and S3, only the parts under test are wired here
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URI
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['JWT_SECRET_KEY'] = 'benchmark'
+    jwt = JWTManager(app)
+    db.init_app(app)
+
+    @jwt.user_identity_loader
+    def user_identity_lookup(identity):
+        return str(identity.id) if isinstance(identity, User) else identity
+
+    @jwt.user_claims_loader
+    def add_claims_to_access_token(identity):
+        return make_access_claims(identity)
+
+    register_error_handlers(app)
+    with app.app_context():
+        from blueprint.auth import auth as auth_route
+        app.register_blueprint(auth_route)
+        db.drop_all()
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
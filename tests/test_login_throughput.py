@@ -0,0 +1,46 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from tests.benchmark import scaled, report
+
+pytest.importorskip('flask')
+pytestmark = pytest.mark.benchmark
+
+PASSWORD = 'Benchmark1!'
+THREADS = 8
+
+
+@pytest.fixture(scope='module')
+def emails(app):
+    from services.user import bulk_create_users
+    from validation.user import CREATE_USER_SCHEMA
+    count = scaled(200)
+    items = [{'email': f'login{index}@benchmark.test', 'name': f'login {index}', 'password': PASSWORD}
+             for index in range(count)]
+    with app.app_context():
+        results = bulk_create_users(items, CREATE_USER_SCHEMA)
+    assert all(result['success'] for result in results)
+    return [item['email'] for item in items]
+
+
+def login(app, email):
+    with app.test_client() as client:
+        return client.post('/auth/login', json={'email': email, 'password': PASSWORD}).status_code
+
+
+def test_login_throughput(app, emails):
+    start = time.perf_counter()
+    statuses = [login(app, email) for email in emails]
+    sequential = len(emails) / (time.perf_counter() - start)
+    assert statuses == [200] * len(emails)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(THREADS) as executor:
+        statuses = list(executor.map(lambda email: login(app, email), emails))
+    concurrent = len(emails) / (time.perf_counter() - start)
+    assert statuses == [200] * len(emails)
+
+    report(f'login, {len(emails)} users', sequential_per_second=sequential,
+           concurrent_per_second=concurrent, threads=THREADS)
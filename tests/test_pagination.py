@@ -0,0 +1,59 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from tests.benchmark import scaled, timed, report
+
+pytest.importorskip('flask')
+pytestmark = pytest.mark.benchmark
+
+PAGE_SIZE = 20
+INSERT_BATCH_SIZE = 10000
+
+
+@pytest.fixture(scope='module')
+def user_count(app):
+    from model import User
+    from model.db import db
+    from config import UserRole, UserStatus
+    count = scaled(100000)
+    start = datetime.utcnow() - timedelta(days=365)
+    with app.app_context():
+        for offset in range(0, count, INSERT_BATCH_SIZE):
+            rows = [{
+                'id': uuid.uuid4(),
+                'email': f'page{index}@benchmark.test',
+                'name': f'page {index}',
+                'role': UserRole.USER.value,
+                'status': UserStatus.ACTIVE.value,
+                'password_hash': '',
+                'token_epoch': 0,
+                'created_at': start + timedelta(seconds=index),
+                'updated_at': start
+            } for index in range(offset, min(offset + INSERT_BATCH_SIZE, count))]
+            db.session.execute(User.__table__.insert(), rows)
+            db.session.commit()
+        db.session.execute(f'ANALYZE "{User.__tablename__}"')
+        db.session.commit()
+    return count
+
+
+def test_cursor_page_beats_deep_offset(app_context, user_count):
+    from model import User
+    columns = [User.created_at, User.id]
+    offset = user_count - 2 * PAGE_SIZE
+    # the cursor of the same deep page: the last row before it
+    before = User.query.order_by(User.created_at.desc(), User.id.desc()).offset(offset - 1).first()
+    after = (before.created_at, before.id)
+
+    offset_page = [user.id for user in User.query.order_by(User.created_at.desc(), User.id.desc())
+                   .offset(offset).limit(PAGE_SIZE)]
+    cursor_page = [user.id for user in User.query.seek(columns, after=after).limit(PAGE_SIZE)]
+    assert cursor_page == offset_page
+
+    offset_latency = timed(lambda: User.query.order_by(User.created_at.desc(), User.id.desc())
+                           .offset(offset).limit(PAGE_SIZE).all(), repeat=20)
+    cursor_latency = timed(lambda: User.query.seek(columns, after=after).limit(PAGE_SIZE).all(), repeat=20)
+    report(f'page of {PAGE_SIZE} at offset {offset}', offset=offset_latency, cursor=cursor_latency)
+    assert cursor_latency < offset_latency
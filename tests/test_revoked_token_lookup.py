@@ -0,0 +1,52 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from tests.benchmark import scaled, timed, report
+
+pytest.importorskip('flask')
+pytestmark = pytest.mark.benchmark
+
+INSERT_BATCH_SIZE = 10000
+
+
+def fill_revoked_tokens(count):
+    """Grows revoked_tokens to ``count`` rows and returns one of the jtis."""
+    from model import RevokedToken
+    from model.db import db
+    expires_at = datetime.utcnow() + timedelta(days=30)
+    missing = count - db.session.query(RevokedToken.id).count()
+    jti = None
+    while missing > 0:
+        rows = [{'jti': str(uuid.uuid4()), 'expires_at': expires_at}
+                for _ in range(min(missing, INSERT_BATCH_SIZE))]
+        db.session.execute(RevokedToken.__table__.insert(), rows)
+        db.session.commit()
+        missing -= len(rows)
+        jti = rows[-1]['jti']
+    return jti
+
+
+def test_revocation_lookup_latency_stays_flat(app_context):
+    from model import RevokedToken
+    from services.token_blacklist import RevokedTokenCache
+    latencies = {}
+    for size in (scaled(10000), scaled(100000)):
+        revoked = fill_revoked_tokens(size)
+        unknown = str(uuid.uuid4())
+        cache = RevokedTokenCache(sync_interval=3600, capacity=2 * size)
+        assert cache.is_revoked(revoked)
+        assert not cache.is_revoked(unknown)
+        latencies[size] = {
+            'db_hit': timed(lambda: RevokedToken.is_jti_blacklisted(revoked)),
+            'db_miss': timed(lambda: RevokedToken.is_jti_blacklisted(unknown)),
+            'cache_hit': timed(lambda: cache.is_revoked(revoked)),
+            'cache_miss': timed(lambda: cache.is_revoked(str(uuid.uuid4())))
+        }
+        report(f'revocation lookup, {size} revoked tokens', **latencies[size])
+    smallest, largest = (latencies[size] for size in sorted(latencies))
+    # the jti index keeps a lookup a single probe however many tokens were revoked
+    assert largest['db_miss'] < 5 * smallest['db_miss']
+    assert largest['cache_miss'] < largest['db_miss']
+    assert largest['cache_hit'] < largest['db_hit']
@@ -7,11 +7,13 @@ import logging
 import traceback
 
 import sentry_sdk
-from flask import current_app as capp, jsonify
+from flask import current_app as capp
 from sqlalchemy.exc import SQLAlchemyError, DBAPIError, IntegrityError
 from voluptuous import Invalid as VoluptuousInvalid
 from werkzeug.exceptions import MethodNotAllowed
 
+from utils.responser import make_json_response
+
 
 class ApplicationError(Exception):
     def __init__(self, message="Application Error", code=400, detail=None, toraise=False):
@@ -48,6 +50,10 @@ class SystemException(Exception):
     pass
 
 
+class ServiceUnavailable(Exception):
+    pass
+
+
 def make_error(message, detail=None, code=400):
     rv = {
         "success": False,
@@ -55,7 +61,7 @@ def make_error(message, detail=None, code=400):
     }
     if detail:
         rv["detail"] = detail
-    return jsonify(rv), code
+    return make_json_response(rv), code
 
 
 def database_rollback():
@@ -86,6 +92,10 @@ def register_error_handlers(app):
     def handle_utils_exception(e):
         return make_error(f"SystemException: {e}", code=500)
 
+    @app.errorhandler(ServiceUnavailable)
+    def handle_service_unavailable(e):
+        return make_error(f"Service Unavailable: {str(e)}", code=503)
+
     @app.errorhandler(PermissionDenied)
     def handle_permission_denied(e):
         return make_error(f"Permission Denied: {str(e)}", code=403)
@@ -0,0 +1,55 @@
+import csv
+import io
+from datetime import datetime
+from itertools import islice
+
+from flask import current_app
+
+from utils.json_backend import backend
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def iter_batches(query, batch_size):
+    """Reads ``query`` through a server-side cursor, ``batch_size`` rows at a time."""
+    rows = iter(query.yield_per(batch_size))
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def generate_ndjson(model, query, fields, batch_size):
+    sort_keys = current_app.config['JSON_SORT_KEYS']
+    ensure_ascii = current_app.config['JSON_AS_ASCII']
+    for batch in iter_batches(query, batch_size):
+        yield b''.join(
+            backend.dumps(item, sort_keys=sort_keys, ensure_ascii=ensure_ascii) + b'\n'
+            for item in model.rows_to_json(batch, fields)
+        )
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def generate_csv(model, query, fields, batch_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for batch in iter_batches(query, batch_size):
+        for item in model.rows_to_json(batch, fields):
+            writer.writerow([_csv_value(item[field]) for field in fields])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
@@ -16,6 +16,15 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def iter_stream(body, chunk_size):
+    """Yields a file-like body in ``chunk_size`` pieces and closes it, even when the client goes away."""
+    try:
+        for chunk in iter(lambda: body.read(chunk_size), b''):
+            yield chunk
+    finally:
+        body.close()
+
+
 def create_folder_upload(directory):
     if not os.path.exists(directory):
         os.makedirs(directory)
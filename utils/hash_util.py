@@ -1,6 +1,8 @@
 import hashlib
 import hmac
-import uuid
+import os
+
+SCRYPT_PREFIX = 'scrypt'
 
 
 def string_to_binary(string):
@@ -22,14 +24,32 @@ def hash_sha256(message):
     return hashlib.sha256(message.encode()).hexdigest()
 
 
-def hash_password(password):
-    salt = uuid.uuid4().hex
-    hashed_password = hashlib.sha512(salt.encode() + password.encode()).hexdigest() + ':' + salt
-    return hashed_password
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r, dklen=64)
+
+
+def hash_password(password, n=2 ** 14, r=8, p=1):
+    salt = os.urandom(16)
+    key = _scrypt(password, salt, n, r, p)
+    return f'{SCRYPT_PREFIX}${n}${r}${p}${salt.hex()}${key.hex()}'
+
+
+def is_legacy_hash(hashed_password):
+    return not hashed_password.startswith(SCRYPT_PREFIX + '$')
 
 
 def check_password(hashed_password, password):
     if (not hashed_password) or (not password):
         return False
-    user_password, salt = hashed_password.split(':')
-    return user_password == hashlib.sha512(salt.encode() + password.encode()).hexdigest()
+    if is_legacy_hash(hashed_password):
+        user_password, salt = hashed_password.split(':')
+        return hmac.compare_digest(user_password, hashlib.sha512(salt.encode() + password.encode()).hexdigest())
+    _, n, r, p, salt, key = hashed_password.split('$')
+    derived = _scrypt(password, bytes.fromhex(salt), int(n), int(r), int(p))
+    return hmac.compare_digest(derived.hex(), key)
+
+
+def needs_rehash(hashed_password, n, r, p):
+    if (not hashed_password) or is_legacy_hash(hashed_password):
+        return True
+    return hashed_password.split('$')[1:4] != [str(n), str(r), str(p)]
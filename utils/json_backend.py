@@ -0,0 +1,70 @@
+"""JSON encoding backends for API responses
+
+``json``, the default, is the standard library with AlchemyEncoder and
+produces exactly what ``flask.jsonify`` did. ``orjson`` is used when
+JSON_BACKEND is ``orjson``, or ``auto`` and the package is installed. It hands
+the payload back to the standard library whenever its bytes could differ:
+pretty printing, bytes from 0x7f up while JSON_AS_ASCII is on, floats in
+exponent form (1e-07), non-string keys and integers beyond 64 bits. Known
+remaining differences are NaN and Enum members, which orjson writes as null
+and by value. Responses built from ``to_json`` never contain the latter,
+generate_json already turns them into names.
+"""
+import json
+import re
+
+from config import JSON_BACKEND
+from utils.model_encoder import AlchemyEncoder, encode_value
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NON_ASCII = re.compile(rb'[\x7f-\xff]')  # the standard library also escapes DEL
+# orjson writes 1e16 and 1e-7 where the standard library writes 1e+16 and 1e-07, matches inside strings only cost a fallback
+EXPONENT = re.compile(rb'\de-?\d')
+
+
+class StdlibBackend(object):
+    name = 'json'
+
+    def dumps(self, obj, sort_keys=True, pretty=False, ensure_ascii=True):
+        if pretty:
+            rv = json.dumps(obj, cls=AlchemyEncoder, sort_keys=sort_keys, ensure_ascii=ensure_ascii,
+                            indent=2, separators=(', ', ': '))
+        else:
+            rv = json.dumps(obj, cls=AlchemyEncoder, sort_keys=sort_keys, ensure_ascii=ensure_ascii,
+                            separators=(',', ':'))
+        return rv.encode('utf-8')
+
+
+class OrjsonBackend(StdlibBackend):
+    name = 'orjson'
+
+    def dumps(self, obj, sort_keys=True, pretty=False, ensure_ascii=True):
+        if pretty:
+            return super(OrjsonBackend, self).dumps(obj, sort_keys, pretty, ensure_ascii)
+        option = orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            rv = orjson.dumps(obj, default=encode_value, option=option)
+        except TypeError:
+            return super(OrjsonBackend, self).dumps(obj, sort_keys, pretty, ensure_ascii)
+        if (ensure_ascii and NON_ASCII.search(rv)) or EXPONENT.search(rv):
+            return super(OrjsonBackend, self).dumps(obj, sort_keys, pretty, ensure_ascii)
+        return rv
+
+
+def make_backend(name=JSON_BACKEND):
+    if name == 'json' or (name == 'auto' and orjson is None):
+        return StdlibBackend()
+    if name in ('orjson', 'auto'):
+        if orjson is None:
+            raise ImportError('JSON_BACKEND is orjson but the orjson package is not installed')
+        return OrjsonBackend()
+    raise ValueError(f'Unknown JSON_BACKEND {name}')
+
+
+backend = make_backend()
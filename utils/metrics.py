@@ -0,0 +1,72 @@
+"""Per-worker counters and timers
+
+Values are kept in process memory, so every gunicorn worker reports its own
+numbers. They are exposed by the admin-only ``GET /metrics`` endpoint.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_timers = {}
+_ratios = {}
+_gauges = {}
+
+
+def incr(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name, seconds):
+    with _lock:
+        timer = _timers.get(name)
+        if timer is None:
+            timer = _timers[name] = {'count': 0, 'total': 0.0, 'max': 0.0}
+        timer['count'] += 1
+        timer['total'] += seconds
+        timer['max'] = max(timer['max'], seconds)
+
+
+@contextmanager
+def timed(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def track_ratio(name, hits, misses):
+    """Reports ``name`` in snapshot as the share of the ``hits`` counters among hits and ``misses``."""
+    _ratios[name] = (list(hits), list(misses))
+
+
+def track_gauge(name, function):
+    """Reports ``name`` in snapshot as the current return value of ``function``."""
+    _gauges[name] = function
+
+
+def ratio(hits, misses):
+    total = hits + misses
+    return round(hits / total, 4) if total else None
+
+
+def snapshot():
+    with _lock:
+        timers = {}
+        for name, timer in _timers.items():
+            timers[name] = {
+                'count': timer['count'],
+                'avg_ms': round(timer['total'] / timer['count'] * 1000, 3),
+                'max_ms': round(timer['max'] * 1000, 3),
+            }
+        ratios = {}
+        for name, (hits, misses) in _ratios.items():
+            ratios[name] = ratio(sum(_counters.get(key, 0) for key in hits),
+                                 sum(_counters.get(key, 0) for key in misses))
+        counters = dict(_counters)
+    gauges = {name: function() for name, function in _gauges.items()}
+    return {'counters': counters, 'timers': timers, 'ratios': ratios, 'gauges': gauges}
@@ -6,6 +6,10 @@ from datetime import date, datetime
 from sqlalchemy.ext.declarative import DeclarativeMeta
 from werkzeug.http import http_date
 
+JSON_NATIVE_TYPES = (str, int, float, bool, type(None), list, tuple, dict)
+
+_model_fields = {}
+
 
 class AlchemyEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -14,18 +18,7 @@ class AlchemyEncoder(json.JSONEncoder):
             return encoded_value
         if isinstance(obj.__class__, DeclarativeMeta):
             fields = {}
-            hidden = obj.__json_hidden__ or []
-            valid_fields = []
-            for x in dir(obj):
-                if (
-                        not x.startswith('_')
-                        and x not in ['metadata']
-                        and x not in hidden
-                        and callable(obj.__getattribute__(x)) is False
-                ):
-                    valid_fields.append(x)
-
-            for field in valid_fields:
+            for field in _get_model_fields(obj):
                 success, value = _encode_primary_value(obj.__getattribute__(field))
                 fields[field] = value
 
@@ -33,6 +26,29 @@ class AlchemyEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
+def _get_model_fields(obj):
+    # dir() is slow, resolve the serializable attributes once per model class
+    valid_fields = _model_fields.get(obj.__class__)
+    if valid_fields is None:
+        hidden = obj.__json_hidden__ or []
+        valid_fields = []
+        for x in dir(obj):
+            if (
+                    not x.startswith('_')
+                    and x not in ['metadata']
+                    and x not in hidden
+                    and callable(obj.__getattribute__(x)) is False
+            ):
+                valid_fields.append(x)
+        _model_fields[obj.__class__] = valid_fields
+    return valid_fields
+
+
+def encode_value(value):
+    """``default`` hook for encoders other than AlchemyEncoder."""
+    return AlchemyEncoder().default(value)
+
+
 def _encode_primary_value(value):
     if isinstance(value, set):
         return True, list(value)
@@ -44,8 +60,6 @@ def _encode_primary_value(value):
         return True, str(value)
     if isinstance(value, enum.Enum) and hasattr(value, "name"):
         return True, value.name
-    try:
-        json.dumps(value)
+    if isinstance(value, JSON_NATIVE_TYPES):
         return True, value
-    except TypeError:
-        return False, None
+    return False, None
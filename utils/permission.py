@@ -1,23 +1,67 @@
+import time
 from functools import wraps
 
-from config import UserStatus
+from config import UserStatus, AUTHZ_CLAIMS_MAX_AGE
 
 from flask import request
-from flask_jwt_extended import get_jwt_identity
+from flask_jwt_extended import get_jwt_identity, get_raw_jwt
+from werkzeug.local import LocalProxy
 
 from model import User
+from services.token_epoch import get_token_epoch
+from services.user import get_user_role_and_status
+from utils import metrics
 from utils.exceptions import PermissionDenied
 
 
+def make_access_claims(identity):
+    """Claims embedded in access tokens, ``identity`` is a User at login and a user id on refresh."""
+    if isinstance(identity, User):
+        # the row was just read, the worker cache of epochs may predate a logout on another worker
+        epoch, role, status = identity.token_epoch, identity.role, identity.status
+    else:
+        epoch = get_token_epoch(identity)
+        role, status = get_user_role_and_status(identity)
+    return {
+        'epoch': epoch,
+        'role': role,
+        'status': status
+    }
+
+
+def get_role_and_status(user_id, token):
+    claims = token.get('user_claims', {})
+    if 'role' in claims and time.time() - token['iat'] <= AUTHZ_CLAIMS_MAX_AGE:
+        metrics.incr('authorization.claims')
+        return claims['role'], claims['status']
+    metrics.incr('authorization.lookup')
+    return get_user_role_and_status(user_id)
+
+
+def lazy_user(user_id):
+    loaded = []
+
+    def load():
+        if not loaded:
+            metrics.incr('authorization.user_load')
+            loaded.append(User.query.filter(User.id == user_id, User.status != UserStatus.BLOCKED.value).first())
+        return loaded[0]
+
+    return LocalProxy(load)
+
+
 def authorized(roles: list = []):
     def real_jwt_required(fn):
         @wraps(fn)
         def internal(*args, **kwargs):
-            user_id = get_jwt_identity()
-            user = User.query.filter(User.id == user_id, User.status != UserStatus.BLOCKED.value).first()
-            if user.role not in roles:
-                raise PermissionDenied(f'Role {user.role} is not allowed to perform this action')
-            request.user = user
+            with metrics.timed('authorization'):
+                user_id = get_jwt_identity()
+                role, status = get_role_and_status(user_id, get_raw_jwt())
+            if status is None or status == UserStatus.BLOCKED.value:
+                raise PermissionDenied('User not found or is blocked')
+            if role not in roles:
+                raise PermissionDenied(f'Role {role} is not allowed to perform this action')
+            request.user = lazy_user(user_id)
             return fn(*args, **kwargs)
 
         return internal
@@ -1,8 +1,14 @@
+import base64
+import binascii
 import hashlib
 import hmac
+import json
+import uuid
+from datetime import datetime
 
 from dateutil.parser import parse
-from sqlalchemy import desc, asc
+from sqlalchemy import desc, asc, DateTime, Integer
+from sqlalchemy.dialects.postgresql import UUID
 
 from utils.exceptions import BadRequest, Unauthorized
 
@@ -25,6 +31,74 @@ def get_pagination_params(request):
     return offset, limit
 
 
+def encode_cursor(sort_key, values):
+    values = [v.isoformat() if isinstance(v, datetime) else str(v) for v in values]
+    payload = json.dumps({'k': sort_key, 'v': values}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def get_cursor_param(request, sort_key, columns):
+    """
+    Decodes ``?cursor=`` into the key values of the last row of the previous
+    page, converted to the types of ``columns``. Returns None when the request
+    uses offset pagination.
+    """
+    cursor = request.args.get('cursor', None)
+    if cursor is None:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        values = payload['v']
+        cursor_sort_key = payload['k']
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise BadRequest('cursor is invalid')
+    if cursor_sort_key != sort_key:
+        raise BadRequest('cursor does not match the requested sort')
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise BadRequest('cursor is invalid')
+    try:
+        return [_parse_cursor_value(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError, OverflowError):
+        raise BadRequest('cursor is invalid')
+
+
+def _parse_cursor_value(column, value):
+    if not isinstance(value, str):
+        raise TypeError(value)
+    if isinstance(column.type, DateTime):
+        return parse(value)
+    if isinstance(column.type, UUID):
+        return uuid.UUID(value) if column.type.as_uuid else str(uuid.UUID(value))
+    if isinstance(column.type, Integer):
+        return int(value)
+    return value
+
+
+def get_fields_param(request, allowed_fields):
+    """Parses ``?fields=a,b`` into a list of field names, None when the parameter is absent."""
+    param = request.args.get('fields', None)
+    if param is None:
+        return None
+    fields = []
+    for field in param.split(','):
+        field = field.strip()
+        if field and field not in fields:
+            fields.append(field)
+    invalid = [field for field in fields if field not in allowed_fields]
+    if invalid:
+        raise BadRequest(f"fields {', '.join(invalid)} can not be selected")
+    if not fields:
+        raise BadRequest('fields must not be empty')
+    return fields
+
+
+def get_count_mode(request, modes, default='exact'):
+    mode = request.args.get('count', default)
+    if mode not in modes:
+        raise BadRequest(f"count must be one of {', '.join(modes)}")
+    return mode
+
+
 def get_sort(request, map_sort, default_sort_by):
     request_sort_by = request.args.get("sort_by", None)
     sort_by = map_sort[request_sort_by] if request_sort_by is not None and request_sort_by in map_sort \
@@ -1,7 +1,42 @@
-from flask import jsonify
+import hashlib
 
+from flask import current_app, request
 
-def generate_success_response(data=None, offset=None, limit=None, total=None):
+from utils import metrics
+from utils.json_backend import backend
+
+
+def make_json_response(data, code=200):
+    """Same bytes as flask.jsonify, encoded by the configured JSON backend."""
+    config = current_app.config
+    body = backend.dumps(
+        data,
+        sort_keys=config['JSON_SORT_KEYS'],
+        pretty=config['JSONIFY_PRETTYPRINT_REGULAR'] or current_app.debug,
+        ensure_ascii=config['JSON_AS_ASCII']
+    )
+    return current_app.response_class(body + b'\n', status=code, mimetype=config['JSONIFY_MIMETYPE'])
+
+
+def make_etag(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def is_not_modified(etag):
+    # If-None-Match is always compared weakly (RFC 7232, section 3.2)
+    return request.if_none_match.contains_weak(etag)
+
+
+def generate_not_modified_response(etag, weak=False):
+    metrics.incr('etag.not_modified')
+    response = current_app.response_class(status=304)
+    response.set_etag(etag, weak)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def generate_success_response(data=None, offset=None, limit=None, total=None, next_cursor=None, total_mode=None,
+                              etag=None, weak_etag=False):
     result = {'success': True, 'data': data}
     if offset is not None:
         result['offset'] = offset
@@ -9,4 +44,14 @@ def generate_success_response(data=None, offset=None, limit=None, total=None):
         result['limit'] = limit
     if total is not None:
         result['total'] = total
-    return jsonify(result)
+    if total_mode is not None:
+        result['total_mode'] = total_mode
+    if next_cursor is not None:
+        result['next_cursor'] = next_cursor
+    response = make_json_response(result)
+    if total is not None:
+        response.headers['X-Total-Count'] = str(total)
+    if etag is not None:
+        response.set_etag(etag, weak_etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
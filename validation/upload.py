@@ -0,0 +1,11 @@
+from voluptuous import All, Optional, Range, Required, Schema
+
+from config import UploadMethod, UPLOAD_SESSION_MAX_SIZE
+from utils.schema_validator import string_schema, filename_schema, enum_value
+
+CREATE_UPLOAD_SESSION_SCHEMA = Schema({
+    Required('filename'): filename_schema,
+    Required('content_type'): string_schema,
+    Required('size'): All(int, Range(min=1, max=UPLOAD_SESSION_MAX_SIZE)),
+    Optional('method', default=UploadMethod.POST.value): enum_value(UploadMethod)
+})
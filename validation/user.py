@@ -1,13 +1,14 @@
-from voluptuous import Optional, Schema, Required
+from voluptuous import All, Length, Optional, Schema, Required
 
-from services.user import find_user_by_email
+from config import BULK_CREATE_MAX_ITEMS, BULK_UPDATE_MAX_ITEMS, UserRole, UserStatus
+
+from services.user import email_exists
 from utils.exceptions import BadRequest
-from utils.schema_validator import string_schema, password_schema, email_schema
+from utils.schema_validator import string_schema, password_schema, email_schema, enum_value, UUID_schema
 
 
 def check_is_new_email(email):
-    user = find_user_by_email(email)
-    if bool(user):
+    if email_exists(email):
         raise BadRequest('email already exists')
     return
 
@@ -21,3 +22,15 @@ CREATE_USER_SCHEMA = Schema({
     Required('name'): string_schema,
     Required('password'): password_schema
 })
+
+BULK_CREATE_USER_SCHEMA = Schema(All([dict], Length(min=1, max=BULK_CREATE_MAX_ITEMS)))
+
+BULK_UPDATE_USER_SCHEMA = Schema({
+    Optional('ids'): All([UUID_schema], Length(min=1, max=BULK_UPDATE_MAX_ITEMS)),
+    Optional('filter'): All({
+        Optional('role'): enum_value(UserRole),
+        Optional('status'): enum_value(UserStatus)
+    }, Length(min=1)),
+    Optional('role'): enum_value(UserRole),
+    Optional('status'): enum_value(UserStatus)
+})